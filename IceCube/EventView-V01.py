@@ -2,6 +2,7 @@ from manim import *
 import h5py
 import numpy as np
 from collections import defaultdict
+from detector_cloud import DetectorPointCloud
 
 class DetectorVisualization(ThreeDScene):
     def __init__(self):
@@ -97,14 +98,12 @@ class DetectorVisualization(ThreeDScene):
         self.load_event_data('oscNext_genie_level7_v02.00_pass2.120000.000000.hdf5', target_run, target_event)
         self.calculate_time_window()
 
-        # Create visualization
-        detector = VGroup()
+        # Create visualization (a Group, since the point cloud is not a VMobject)
+        detector = Group()
         
-        # Add white dots for all modules
-        for pos in self.module_positions.values():
-            dot = Sphere(radius=0.02).set_color(WHITE)
-            dot.move_to(pos)
-            detector.add(dot)
+        # Add white dots for all modules, as a single point-cloud layer
+        detector.add(DetectorPointCloud(np.array(list(self.module_positions.values())),
+                                        colors=WHITE, sizes=2))
             
         # Add colored spheres for hit modules
         print(f'Assign colors to light arrival times')
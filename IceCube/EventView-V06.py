@@ -1,179 +1,212 @@
 from manim import *
-import h5py
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
 import numpy as np
-from collections import defaultdict
+from PIL import Image, ImageDraw
+from pulses import read_event_pulses, publish_event_index, attach_event_index
+from hits import aggregate_hits, time_window, cumulative_charge
+from colormap import TimeColormap
+from catalog import EventCatalog, update_catalog
+from geometry import load_detector_geometry, publish_geometry, attach_geometry, GEOMETRY_FILE
+from render_settings import RenderSettings, RenderSettingsMixin
+from detector_cloud import DetectorPointCloud
+from render_cache import RenderCache, content_key
+from instrumentation import instrumented, stage, context
+from dom_markers import (dom_marker, camera_direction, projected_pixel_radius, marker_resolutions,
+                         RESOLUTION_LEVELS)
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-class StaticDetectorVisualization(ThreeDScene):
-    def __init__(self):
-        super().__init__()
-        self.module_positions = {}
+PULSE_FILE = 'oscNext_genie_level7_v02.00_pass2.120000.000000.hdf5' # nue(?)
+#PULSE_FILE = 'oscNext_genie_level7_v02.00_pass2.140000.000001.hdf5' # numu
+
+STATIC_IMAGE_SETTINGS = RenderSettings(pixel_width=480, pixel_height=480, media_width="480",
+                                       save_last_frame=True, write_to_movie=False)
+# Named camera orientations (phi, theta) for multi-view renders
+MULTI_VIEWS = {
+    'top': (0 * DEGREES, -90 * DEGREES),
+    'side_0': (90 * DEGREES, 0 * DEGREES),
+    'side_90': (90 * DEGREES, 90 * DEGREES),
+    'side_180': (90 * DEGREES, 180 * DEGREES),
+    'side_270': (90 * DEGREES, 270 * DEGREES),
+    'oblique': (60 * DEGREES, 45 * DEGREES),
+}
+TIME_EVOLUTION_SETTINGS = RenderSettings(pixel_width=480, pixel_height=480, media_width="480",
+                                         frame_rate=15, save_last_frame=False, write_to_movie=True)
+ORBIT_SETTINGS = TIME_EVOLUTION_SETTINGS
+# Scene options of the draft tier (--draft), used with RenderSettings.draft(): coarse unshaded
+# markers and only the brightest DOMs, in the same layout as the full-quality render
+DRAFT_SCENE_OPTIONS = {'max_resolution': RESOLUTION_LEVELS[0], 'shading': False, 'max_doms': 200}
+
+class StaticDetectorVisualization(RenderSettingsMixin, ThreeDScene):
+    # Side view with z-axis running vertically
+    # phi=90 gives a view perpendicular to the z-axis
+    # theta controls the rotation around the z-axis (0, 90, 180, 270 give different side views)
+    camera_phi = 90 * DEGREES
+    camera_theta = 0 * DEGREES
+    focal_distance = 8
+    # geo distances are in meters, so sphere radius needs to be < ~7m (in DeepCore)
+    radius_scale = 3.
+
+    def __init__(self, run=None, event=None, filename=PULSE_FILE, show_detector=False,
+                 max_resolution=RESOLUTION_LEVELS[-1], shading=True, max_doms=None, **kwargs):
+        super().__init__(**kwargs)
+        self.show_detector = show_detector
+        # Marker quality: sphere resolution cap, gloss/shadow, and at most max_doms markers
+        # (the highest-charge DOMs); the layout does not depend on them
+        self.max_resolution = max_resolution
+        self.shading = shading
+        self.max_doms = max_doms
+        self.run = run
+        self.event = event
+        self.filename = filename
+        self.geometry = None
         self.event_centroid = np.array([0, 0, 0])
+        self.colormap = TimeColormap()
+        # Filled in by create_visualization: the event's DOMHits, its colour time window, the
+        # group of event mobjects in the scene and the marker of each hit DOM (None for modules
+        # missing from the geometry)
+        self.hit_data = None
+        self.event_time_window = (0, 1)
+        self.detector = None
+        self.dom_markers = []
         
+    @instrumented()
     def load_geometry(self):
         print("Loading geometry file...")
-        with h5py.File('GeoCalibDetectorStatus_AVG_55697-57531_PASS2_SPE_withScaledNoise.hdf5', 'r') as f:
-            print("Reading geometry data...")
-            geo_data = np.array(f['geo'])
-            labels = np.array([label.decode('utf-8') for label in f['labels']])
-            col_indices = {label: idx for idx, label in enumerate(labels)}
-            
-            print("Processing geometry rows...")
-            for row in geo_data:
-                string = int(row[col_indices['string']])
-                om = int(row[col_indices['om']])
-                pos = (float(row[col_indices['pos_x']]),
-                      float(row[col_indices['pos_y']]),
-                      float(row[col_indices['pos_z']]))
-                self.module_positions[(string, om)] = pos
-            print(f"Loaded {len(self.module_positions)} module positions")
+        # Parsed once per process (and compiled to .npz on disk), so repeat renders are cheap
+        self.geometry = load_detector_geometry(GEOMETRY_FILE)
+        print(f"Loaded {len(self.geometry)} module positions")
 
+    @instrumented()
     def process_event(self, filename, target_run, target_event):
         print(f"Processing event {target_run}, {target_event}")
-        hit_data = defaultdict(list)
-        with h5py.File(filename, 'r') as f:
-            print("Reading hit data...")
-            hits = np.array(f['SRTTWOfflinePulsesDC'])
-            event_hits = hits[(hits['Run'] == target_run) & 
-                            (hits['Event'] == target_event)]
-            
-            print(f"Found {len(event_hits)} hits for this event")
-            for hit in event_hits:
-                string = int(hit['string'])
-                om = int(hit['om'])
-                hit_data[(string, om)].append((float(hit['time']), float(hit['charge'])))
-            print(f"Grouped hits into {len(hit_data)} modules")
+        print("Reading hit data...")
+        # Only the rows of this event are read, using the per-file (Run, Event) index
+        event_hits = read_event_pulses(filename, target_run, target_event)
+        
+        print(f"Found {len(event_hits)} hits for this event")
+        hit_data = aggregate_hits(event_hits)
+        print(f"Grouped hits into {len(hit_data)} modules")
         return hit_data
 
-    def calculate_time_window(self, hit_data):
+    @instrumented()
+    def calculate_time_window(self, hit_data, containment=0.9, charge_weighted=False):
         print("Calculating time window...")
-        all_times = []
-        for hits in hit_data.values():
-            for time, _ in hits:
-                all_times.append(time)
-                
-        if not all_times:
+        if not hit_data.n_pulses:
             print("No hits found!")
             return 0, 1
             
-        sorted_times = np.sort(all_times)
-        n_hits = len(sorted_times)
-        window_size = int(0.9 * n_hits)
-        min_range = float('inf')
-        time_min = sorted_times[0]
-        time_max = sorted_times[-1]
-
-        print(f'Initial time range: {time_min:.2f} to {time_max:.2f}')
-        
-        if n_hits > window_size:
-            print(f"Finding optimal window for {n_hits} hits...")
-            for i in range(n_hits - window_size):
-                current_range = sorted_times[i + window_size] - sorted_times[i]
-                if current_range < min_range:
-                    min_range = current_range
-                    time_min = sorted_times[i]
-                    time_max = sorted_times[i + window_size]
+        print(f'Initial time range: {hit_data.times.min():.2f} to {hit_data.times.max():.2f}')
+        print(f"Finding optimal window for {hit_data.n_pulses} hits...")
+        weights = hit_data.charges if charge_weighted else None
+        time_min, time_max = time_window(hit_data.times, containment, weights)
         print(f'Final time window: {time_min:.2f} to {time_max:.2f}')
         return time_min, time_max
 
-    def get_color_for_time(self, time, time_min, time_max):
-        colors = [RED, ORANGE, YELLOW, GREEN, BLUE, PURPLE]
-        if time < time_min:
-            print(f"Time {time:.2f} below time window, using RED")
-            return RED
-        if time > time_max:
-            print(f"Time {time:.2f} above time window, using PURPLE")
-            return PURPLE
-        
-        t = (time - time_min) / (time_max - time_min)
-        color_idx = t * (len(colors) - 1)
-        idx1 = int(color_idx)
-        idx2 = min(idx1 + 1, len(colors) - 1)
-        t_interp = color_idx - idx1
-        return interpolate_color(colors[idx1], colors[idx2], t_interp)
-
-    def create_visualization(self, run, event):
+    def get_colors_for_times(self, times, time_min, time_max):
+        n_below = np.count_nonzero(times < time_min)
+        n_above = np.count_nonzero(times > time_max)
+        if n_below or n_above:
+            print(f"{n_below} module times below time window (RED), {n_above} above (PURPLE)")
+        return self.colormap.colors(times, time_min, time_max)
+
+    def marker_depths(self, offsets):
+        """Distance of each marker towards the camera, which sets its sphere resolution."""
+        return offsets @ camera_direction(self.camera_phi, self.camera_theta)
+
+    def marker_radii(self, charges, max_charge):
+        return self.radius_scale * (0.5 + (charges / max_charge) * 1.5)
+
+    @instrumented()
+    def create_visualization(self, run, event, filename=PULSE_FILE):
         print(f"\nCreating visualization for Run {run}, Event {event}")
-        filename = 'oscNext_genie_level7_v02.00_pass2.120000.000000.hdf5'
         self.load_geometry()
         hit_data = self.process_event(filename, run, event)
         
         time_min, time_max = self.calculate_time_window(hit_data)
         detector = VGroup()
+        self.detector = detector
+        self.hit_data = hit_data
+        self.event_time_window = (time_min, time_max)
+        self.dom_markers = [None] * len(hit_data)
         
         if hit_data:
             print("\nProcessing hits for visualization...")
-            max_charge = max(sum(charge for _, charge in hits) 
-                           for hits in hit_data.values())
+            max_charge = hit_data.total_charge.max()
+            dom_colors = self.get_colors_for_times(hit_data.mean_time, time_min, time_max)
             print(f"Maximum total charge in any module: {max_charge:.2f}")
             
-            # Calculate centroid of hit modules for coordinate system origin
-            hit_positions = [np.array(self.module_positions[(string, om)])
-                            for (string, om) in hit_data.keys()
-                            if (string, om) in self.module_positions]
+            # Look up all hit module positions at once (NaN rows for unknown modules)
+            dom_strings, dom_oms = hit_data.strings, hit_data.oms
+            dom_positions = self.geometry.positions_for(dom_strings, dom_oms)
+            in_geometry = ~np.isnan(dom_positions[:, 0])
+            hit_positions = dom_positions[in_geometry]
             
-            if hit_positions:
-                self.event_centroid = np.mean(hit_positions, axis=0)
+            # Calculate centroid of hit modules for coordinate system origin
+            if len(hit_positions):
+                self.event_centroid = hit_positions.mean(axis=0)
                 print(f"Event centroid: ({self.event_centroid[0]:.2f}, {self.event_centroid[1]:.2f}, {self.event_centroid[2]:.2f})")
             
             # Identify strings with hits
-            hit_strings = {string for (string, om) in hit_data.keys() 
-                          if (string, om) in self.module_positions}
-            print(f"Strings with hits: {hit_strings}")
+            hit_strings = np.unique(dom_strings[in_geometry])
+            print(f"Strings with hits: {set(hit_strings.tolist())}")
             
             # Find min and max z-coordinates of all modules with hits
-            z_coords = [self.module_positions[(string, om)][2] 
-                       for (string, om) in hit_data.keys() 
-                       if (string, om) in self.module_positions]
-            
-            if z_coords:
-                min_z, max_z = min(z_coords), max(z_coords)
+            if len(hit_positions):
+                min_z, max_z = hit_positions[:, 2].min(), hit_positions[:, 2].max()
                 print(f"Z-coordinate range: {min_z:.2f} to {max_z:.2f}")
                 
-                # Add string lines
-                for string in hit_strings:
-                    # Find any module on this string to get the x,y position
-                    for om in range(1, 61):  # Typical range of OMs per string
-                        if (string, om) in self.module_positions:
-                            pos = np.array(self.module_positions[(string, om)])
-                            x, y = pos[0], pos[1]
-                            
-                            # Create line relative to centroid
-                            start_point = np.array([x, y, min_z]) - self.event_centroid
-                            end_point = np.array([x, y, max_z]) - self.event_centroid
-                            
-                            line = Line(start_point, end_point, color=WHITE, stroke_width=1)
-                            detector.add(line)
-                            print(f"Added line for string {string} at x={x:.2f}, y={y:.2f}")
-                            break
+                # Add string lines, using the x,y of each string's first module
+                for string, (x, y) in zip(hit_strings, self.geometry.string_xy(hit_strings)):
+                    # Create line relative to centroid
+                    start_point = np.array([x, y, min_z]) - self.event_centroid
+                    end_point = np.array([x, y, max_z]) - self.event_centroid
+                    
+                    line = Line(start_point, end_point, color=WHITE, stroke_width=1)
+                    detector.add(line)
+                    print(f"Added line for string {string} at x={x:.2f}, y={y:.2f}")
+            
+            # Marker sizes, and a sphere resolution for each from its size on screen
+            dom_radii = self.marker_radii(hit_data.total_charge, max_charge)
+            depths = self.marker_depths(dom_positions - self.event_centroid)
+            dom_resolutions = marker_resolutions(
+                projected_pixel_radius(dom_radii, depths, self.focal_distance), self.max_resolution)
+            
+            drawn = np.ones(len(hit_data), dtype=bool)
+            if self.max_doms is not None and len(hit_data) > self.max_doms:
+                drawn[:] = False
+                drawn[np.argsort(-hit_data.total_charge, kind='stable')[:self.max_doms]] = True
+                print(f"Drawing the {self.max_doms} highest-charge of {len(hit_data)} modules")
             
             # Add hit modules as spheres
-            for (string, om), hits in hit_data.items():
-                if (string, om) not in self.module_positions:
+            for i, (string, om) in enumerate(zip(dom_strings, dom_oms)):
+                if not in_geometry[i]:
                     print(f"Warning: Module ({string}, {om}) not in geometry!")
                     continue
+                if not drawn[i]:
+                    continue
                 
-                pos = np.array(self.module_positions[(string, om)])
+                pos = dom_positions[i]
                 x, y, z = pos
                 # Adjust position relative to centroid
                 adjusted_pos = pos - self.event_centroid
                 
                 print(f"\nProcessing string {string}, OM {om} at x={x:.2f}, y={y:.2f}, z={z:.2f}:")
                 
-                total_charge = sum(charge for _, charge in hits)
-                avg_time = np.mean([time for time, _ in hits])
+                total_charge = hit_data.total_charge[i]
+                avg_time = hit_data.mean_time[i]
                 
-                radius = 0.5 + (total_charge / max_charge) * 1.5
-                radius = 3.*radius # geo distances are in meters, so sphere radius needs to be < ~7m (in DeepCore)
-                color = self.get_color_for_time(avg_time, time_min, time_max)
-                print(f"  Qtot: {total_charge:.2f}, tave: {avg_time:.2f}, rDOM: {radius:.2f}, color: {color}")
+                radius = dom_radii[i]
+                color = dom_colors[i]
+                print(f"  Qtot: {total_charge:.2f}, tave: {avg_time:.2f}, rDOM: {radius:.2f}, color: {color}, resolution: {dom_resolutions[i]}")
                 
-                sphere = Sphere(radius=radius, resolution=(32, 32))
-                sphere.set_color(color)
-                sphere.set_opacity(1.0)
-                sphere.set_gloss(0.5)
-                sphere.set_shadow(0.2)
-                sphere.move_to(adjusted_pos)
-                detector.add(sphere)
+                self.dom_markers[i] = dom_marker(adjusted_pos, radius, color, dom_resolutions[i], self.shading)
+                detector.add(self.dom_markers[i])
         
         # Create a coordinate axes indicator
         axes_scale = 5.0  # Size of the axes
@@ -197,56 +230,393 @@ class StaticDetectorVisualization(ThreeDScene):
         text.set_color(WHITE)
         text.scale(0.5)
         
+        if self.show_detector:
+            # Every module of the detector as one point-cloud layer, for context
+            cloud = DetectorPointCloud(self.geometry.positions - self.event_centroid,
+                                       colors=GREY, sizes=2)
+            self.add(cloud)
+        
         self.add(detector, axes, text)
         
-        # Set up a side view with z-axis running vertically
-        # phi=90 gives a view perpendicular to the z-axis
-        # theta controls the rotation around the z-axis (0, 90, 180, 270 give different side views)
-        self.set_camera_orientation(phi=90 * DEGREES, theta=0 * DEGREES, focal_distance=8)
+        self.set_camera_orientation(phi=self.camera_phi, theta=self.camera_theta,
+                                    focal_distance=self.focal_distance)
         self.camera.light_source.move_to(10*RIGHT + 10*IN + 10*UP)
         self.wait(0)
+
+    def construct(self):
+        if self.run is not None:
+            self.create_visualization(self.run, self.event, self.filename)
+        
+class TimeEvolutionVisualization(StaticDetectorVisualization):
+    """The static event view, animated: DOMs appear in time order and grow with their
+    collected charge over the event's colour time window, ending on the static image."""
+    def __init__(self, run=None, event=None, filename=PULSE_FILE, duration=4., **kwargs):
+        super().__init__(run, event, filename, **kwargs)
+        self.duration = duration
+
+    @instrumented()
+    def animate_time_evolution(self):
+        markers = self.dom_markers
+        if not markers:
+            return
+        time_min, time_max = self.event_time_window
+        n_frames = max(int(self.duration * config.frame_rate), 1) + 1
+        frame_times = np.linspace(time_min, time_max, n_frames)
+        print(f"Animating {len(markers)} modules over {n_frames} frames...")
+        
+        # Marker radius of every DOM at every frame, 0 while it has no charge yet
+        charge = cumulative_charge(self.hit_data, frame_times)
+        radii = np.where(charge > 0, self.marker_radii(charge, self.hit_data.total_charge.max()), 0.)
+        # Markers are built at their final radius, which never changes while hidden
+        marker_radii = radii[:, -1].copy()
+        shown_radii = np.full(len(markers), -1.)
+        
+        # One updater for all markers, changing only the DOMs whose radius changed
+        progress = ValueTracker(0)
+        def update_markers(group):
+            frame = int(round(progress.get_value() * (n_frames - 1)))
+            frame_radii = radii[:, frame]
+            for i in np.flatnonzero(frame_radii != shown_radii).tolist():
+                marker = markers[i]
+                if marker is None:
+                    continue
+                if frame_radii[i] > 0:
+                    marker.scale(frame_radii[i] / marker_radii[i])
+                    marker_radii[i] = frame_radii[i]
+                marker.set_opacity(1.0 if frame_radii[i] > 0 else 0.)
+            shown_radii[:] = frame_radii
+        
+        # The updater sits on the event group that is in the scene, so it runs every frame
+        self.detector.add_updater(update_markers)
+        update_markers(self.detector)
+        self.play(progress.animate.set_value(1), run_time=self.duration, rate_func=linear)
+        self.detector.remove_updater(update_markers)
+        self.wait(1)
+
+    def construct(self):
+        if self.run is not None:
+            self.create_visualization(self.run, self.event, self.filename)
+            self.animate_time_evolution()
+
+class MultiViewVisualization(StaticDetectorVisualization):
+    """Build the event once and save one image per named camera orientation,
+    plus optionally a tiled montage of them."""
+    def __init__(self, run=None, event=None, filename=PULSE_FILE, views=tuple(MULTI_VIEWS), montage=True,
+                 **kwargs):
+        super().__init__(run, event, filename, **kwargs)
+        self.views = list(views)
+        self.montage = montage
+        self.view_files = []
+
+    def marker_depths(self, offsets):
+        # Markers must be fine enough for the view in which they are closest to the camera
+        return np.max([offsets @ camera_direction(*MULTI_VIEWS[view]) for view in self.views], axis=0)
+
+    @instrumented()
+    def render_views(self):
+        stem = os.path.splitext(str(self.renderer.file_writer.image_file_path))[0]
+        images = []
+        for view in self.views:
+            phi, theta = MULTI_VIEWS[view]
+            self.set_camera_orientation(phi=phi, theta=theta, focal_distance=self.focal_distance)
+            self.renderer.update_frame(self)
+            image = Image.fromarray(self.renderer.get_frame())
+            path = f"{stem}_{view}.png"
+            image.save(path)
+            self.view_files.append(path)
+            images.append(image)
+            print(f"Saved {view} view to {path}")
         
-def render_static_image(run, event):
+        if self.montage and images:
+            n_columns = int(np.ceil(np.sqrt(len(images))))
+            n_rows = int(np.ceil(len(images) / n_columns))
+            width, height = images[0].size
+            montage = Image.new(images[0].mode, (n_columns * width, n_rows * height))
+            draw = ImageDraw.Draw(montage)
+            for i, (view, image) in enumerate(zip(self.views, images)):
+                x, y = (i % n_columns) * width, (i // n_columns) * height
+                montage.paste(image, (x, y))
+                draw.text((x + 5, y + 5), view, fill='white')
+            path = f"{stem}_views.png"
+            montage.save(path)
+            self.view_files.append(path)
+            print(f"Saved {len(images)}-view montage to {path}")
+        
+        # Leave the scene's own last frame in the default orientation
+        self.set_camera_orientation(phi=self.camera_phi, theta=self.camera_theta,
+                                    focal_distance=self.focal_distance)
+
+    def construct(self):
+        if self.run is not None:
+            self.create_visualization(self.run, self.event, self.filename)
+            self.render_views()
+
+class OrbitDetectorVisualization(StaticDetectorVisualization):
+    """Turntable movie of the event: the camera turns about the z axis from
+    theta_start to theta_end at constant speed.  render_orbit() splits a full
+    turn into such segments and renders them in parallel."""
+    def __init__(self, run=None, event=None, filename=PULSE_FILE, theta_start=0., theta_end=2 * PI,
+                 run_time=12., **kwargs):
+        super().__init__(run, event, filename, **kwargs)
+        self.camera_theta = theta_start
+        self.theta_end = theta_end
+        self.run_time = run_time
+
+    def marker_depths(self, offsets):
+        # Largest depth over a whole turn, so all segments of an orbit use the same markers
+        return (np.sin(self.camera_phi) * np.hypot(offsets[:, 0], offsets[:, 1]) +
+                np.cos(self.camera_phi) * offsets[:, 2])
+
+    def construct(self):
+        if self.run is not None:
+            self.create_visualization(self.run, self.event, self.filename)
+            self.move_camera(theta=self.theta_end, run_time=self.run_time, rate_func=linear)
+
+def render_multi_view(run, event, filename=PULSE_FILE, views=tuple(MULTI_VIEWS), montage=True,
+                      settings=STATIC_IMAGE_SETTINGS, **scene_options):
+    """Render several camera views of one event from a single build; returns the image paths."""
+    print(f"\nStarting {len(views)}-view render for Run {run}, Event {event}")
+    settings = settings.replace(output_file=f"run{run}_event{event}")
+    with context(run=run, event=event, filename=filename):
+        scene = MultiViewVisualization(run, event, filename, views, montage, render_settings=settings,
+                                       **scene_options)
+        with stage('render', scene):
+            scene.render()
+    return scene.view_files
+
+def render_cache_key(scene_class, run, event, filename, settings, scene_options):
+    """Hash of the event's pulses, the geometry and every parameter that affects the output."""
+    with settings.applied():
+        frame = (config.pixel_width, config.pixel_height, config.frame_rate, config.frame_width,
+                 str(config.background_color), config.save_last_frame, config.write_to_movie)
+    geometry = load_detector_geometry(GEOMETRY_FILE)
+    camera = (scene_class.camera_phi, scene_class.camera_theta, scene_class.focal_distance)
+    return content_key(scene_class.__name__, read_event_pulses(filename, run, event),
+                       geometry.positions, geometry.strings, geometry.oms, frame, camera,
+                       scene_class.radius_scale, TimeColormap().lut, scene_options)
+
+def render_event(scene_class, run, event, filename, settings, cache=None, **scene_options):
+    """Render one event with scene_class and return the image or movie path.
+
+    With a RenderCache an identical earlier render is returned without building the scene.
+    """
+    suffix = '.mp4' if settings.write_to_movie else '.png'
+    if cache is not None:
+        key = render_cache_key(scene_class, run, event, filename, settings, scene_options)
+        cached = cache.get(key, suffix)
+        if cached is not None:
+            print(f"Using cached render {cached}")
+            return cached
+    
+    with context(run=run, event=event, filename=filename):
+        scene = scene_class(run, event, filename, render_settings=settings, **scene_options)
+        with stage('render', scene):
+            scene.render()
+    file_writer = scene.renderer.file_writer
+    path = str(file_writer.movie_file_path if settings.write_to_movie else file_writer.image_file_path)
+    if cache is not None:
+        cache.put(key, path)
+    return path
+
+def render_time_evolution(run, event, filename=PULSE_FILE, duration=4., settings=TIME_EVOLUTION_SETTINGS,
+                          cache=None, **scene_options):
+    print(f"\nStarting time-evolution render for Run {run}, Event {event}")
+    settings = settings.replace(output_file=f"run{run}_event{event}_time")
+    return render_event(TimeEvolutionVisualization, run, event, filename, settings, cache,
+                        duration=duration, **scene_options)
+
+def render_static_image(run, event, filename=PULSE_FILE, settings=STATIC_IMAGE_SETTINGS, cache=None,
+                        output_file=None, **scene_options):
     print(f"\nStarting render for Run {run}, Event {event}")
-    config.media_width = "480"
-    config.pixel_height = 480
-    config.pixel_width = 480
-    config.save_last_frame = True
-    config.write_to_movie = False
+    # The settings only apply to this scene; the global config is left untouched
+    settings = settings.replace(output_file=output_file or f"run{run}_event{event}")
+    print("Creating visualization and rendering final image...")
+    return render_event(StaticDetectorVisualization, run, event, filename, settings, cache,
+                        **scene_options)
+
+def _init_batch_worker(shared_dir):
+    # Map the geometry and event indices published by the parent instead of re-reading them
+    for entry in sorted(os.listdir(shared_dir)):
+        if entry == 'geometry':
+            attach_geometry(os.path.join(shared_dir, entry))
+        else:
+            attach_event_index(os.path.join(shared_dir, entry))
+
+@contextmanager
+def _worker_pool(filenames, max_workers=None):
+    """Process pool whose workers share the geometry and the event indices of filenames."""
+    shared_dir = tempfile.mkdtemp(prefix='eventview-shared-')
+    try:
+        publish_geometry(os.path.join(shared_dir, 'geometry'), GEOMETRY_FILE)
+        for i, filename in enumerate(sorted(set(filenames))):
+            publish_event_index(os.path.join(shared_dir, f'index{i}'), filename)
+        
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_batch_worker,
+                                 initargs=(shared_dir,)) as pool:
+            yield pool
+    finally:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+def batch_output_file(filename, run, event):
+    # (Run, Event) repeats between pulse files, so batch images also carry the file name
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return f"{stem}_run{run}_event{event}"
+
+def _render_batch_item(item, settings, scene_options):
+    filename, run, event = item
+    return render_static_image(run, event, filename, settings,
+                               output_file=batch_output_file(filename, run, event), **scene_options)
+
+def render_batch(items, max_workers=None, settings=STATIC_IMAGE_SETTINGS, **scene_options):
+    """Render a list of (filename, run, event) items over a pool of processes."""
+    # Workers writing the same output name would overwrite each other's images
+    output_files = [batch_output_file(*item) for item in items]
+    duplicates = sorted(name for name, count in Counter(output_files).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"{len(duplicates)} batch items share an output name, "
+                         f"e.g. {duplicates[0]} (same file name in different directories?)")
+    print(f"Rendering {len(items)} events with {max_workers or os.cpu_count()} workers...")
+    failed = []
+    with _worker_pool([filename for filename, _, _ in items], max_workers) as pool:
+        futures = {pool.submit(_render_batch_item, item, settings, scene_options): item for item in items}
+        for n_done, future in enumerate(as_completed(futures), 1):
+            filename, run, event = futures[future]
+            try:
+                output_file = future.result()
+                print(f"[{n_done}/{len(items)}] Rendered {output_file}")
+            except Exception as err:
+                print(f"[{n_done}/{len(items)}] Run {run}, Event {event} in {filename} failed: {err}")
+                failed.append(futures[future])
+    print(f"Batch finished: {len(items) - len(failed)} rendered, {len(failed)} failed")
+    return failed
+
+def _render_orbit_segment(run, event, filename, settings, theta_start, theta_end, run_time, scene_options):
+    return render_event(OrbitDetectorVisualization, run, event, filename, settings,
+                        theta_start=theta_start, theta_end=theta_end, run_time=run_time,
+                        **scene_options)
+
+def render_orbit(run, event, filename=PULSE_FILE, degrees=360., duration=12., max_workers=None,
+                 settings=ORBIT_SETTINGS, **scene_options):
+    """Render a turntable movie in parallel segments and join them without re-encoding."""
+    # Checked first, so a missing ffmpeg does not cost a whole render
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError("render_orbit needs ffmpeg on the PATH to join the orbit segments")
+    with settings.applied():
+        frame_rate = config.frame_rate
+    n_frames = max(int(round(duration * frame_rate)), 1)
+    n_segments = min(max_workers or os.cpu_count(), n_frames)
+    step = degrees * DEGREES / n_frames
+    theta_start = StaticDetectorVisualization.camera_theta
+    print(f"\nRendering a {degrees:.0f} degree orbit of Run {run}, Event {event}: "
+          f"{n_frames} frames in {n_segments} segments")
+    
+    # Frames are written at t = 0, 1/fps, ... < run_time, so a segment of k frames runs for
+    # (k - 1/2) / fps and turns by (k - 1/2) steps: its frames are exactly the orbit's
+    # frames first .. first + k - 1, and the next segment starts on the following frame
+    bounds = np.linspace(0, n_frames, n_segments + 1).round().astype(int)
+    with _worker_pool([filename], n_segments) as pool:
+        futures = []
+        for i, (first, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            segment_settings = settings.replace(output_file=f"run{run}_event{event}_orbit_part{i:03d}")
+            futures.append(pool.submit(
+                _render_orbit_segment, run, event, filename, segment_settings,
+                theta_start + first * step, theta_start + (stop - 0.5) * step,
+                (stop - first - 0.5) / frame_rate, scene_options))
+        parts = [future.result() for future in futures]
     
-    scene = StaticDetectorVisualization()
-    config.output_file = f"run{run}_event{event}"
-    print("Configuration complete, creating visualization...")
-    scene.create_visualization(run, event)
-    print("Rendering final image...")
-    scene.render()
+    output = os.path.join(os.path.dirname(parts[0]),
+                          f"run{run}_event{event}_orbit{settings.output_suffix}.mp4")
+    list_file = output + '.parts.txt'
+    with open(list_file, 'w') as f:
+        f.writelines(f"file '{os.path.abspath(part)}'\n" for part in parts)
+    try:
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                        '-i', list_file, '-c', 'copy', output], check=True)
+    except subprocess.CalledProcessError as err:
+        raise RuntimeError(f"ffmpeg could not join the {len(parts)} orbit segments into {output} "
+                           f"(exit status {err.returncode}); the segments are kept in "
+                           f"{os.path.dirname(parts[0])}") from err
+    finally:
+        os.remove(list_file)
+    for part in parts:
+        os.remove(part)
+    print(f"Orbit movie written to {output}")
+    return output
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render static IceCube event images")
+    parser.add_argument('--files', nargs='+', default=[PULSE_FILE], help="pulse HDF5 files")
+    parser.add_argument('--run', type=int, help="render this run/event from the first file")
+    parser.add_argument('--event', type=int)
+    parser.add_argument('--query', help='batch-render all events matching a catalog query, '
+                                        'e.g. "n_modules >= 25"')
+    parser.add_argument('--catalog', help="persistent catalog .npz to use/update for --query")
+    parser.add_argument('--limit', type=int, help="render at most this many events of the query")
+    parser.add_argument('--workers', type=int, help="worker processes for --query and --orbit (default: all cores)")
+    parser.add_argument('--show-detector', action='store_true', help="draw all modules as a point cloud")
+    parser.add_argument('--animate', type=float, metavar='SECONDS',
+                        help="render a movie of the event's hits appearing in time order instead of an image")
+    parser.add_argument('--orbit', type=float, metavar='SECONDS',
+                        help="render a 360 degree turntable movie of this length, in parallel segments")
+    parser.add_argument('--views', nargs='*', choices=list(MULTI_VIEWS),
+                        help="save these camera views (all if none are named) from one build of the event")
+    parser.add_argument('--no-montage', action='store_true', help="with --views, skip the tiled montage")
+    parser.add_argument('--draft', action='store_true',
+                        help="quick low-quality render: half resolution, lower frame rate, coarse unshaded "
+                             "markers and at most 200 DOMs")
+    parser.add_argument('--cache-dir', help="reuse identical earlier renders kept in this directory")
+    parser.add_argument('--cache-size', type=float, default=1024., help="render cache size limit in MB")
+    args = parser.parse_args()
+    scene_options = {'show_detector': args.show_detector}
+    if args.draft:
+        scene_options.update(DRAFT_SCENE_OPTIONS)
+    if args.cache_dir:
+        scene_options['cache'] = RenderCache(args.cache_dir, int(args.cache_size * 2**20))
+    
+    def quality(settings):
+        return settings.draft() if args.draft else settings
+
     print("Starting event visualization script...")
-    filename = 'oscNext_genie_level7_v02.00_pass2.120000.000000.hdf5' # nue(?)
-    #filename = 'oscNext_genie_level7_v02.00_pass2.140000.000001.hdf5' # numu 
-    print(f"Reading events from {filename}")
-#    with h5py.File(filename, 'r') as f:
-#        hits = np.array(f['SRTTWOfflinePulsesDC'])
-#        first_event = np.unique(hits[['Run', 'Event']])[0]
-#        run, event = first_event
-#        print(f"Selected Run {run}, Event {event}")
-
-    NMinModules = 25
-    with h5py.File(filename, 'r') as f:
-        hits = np.array(f['SRTTWOfflinePulsesDC'])
-        events = np.unique(hits[['Run', 'Event']])
-        
-        for event_idx, (run, event) in enumerate(events):
-            event_hits = hits[(hits['Run'] == run) & (hits['Event'] == event)]
-            n_modules = len(np.unique(event_hits[['string', 'om']], axis=0))
-            
-            if n_modules >= NMinModules:
-                print(f"Found event {run}, {event} with {n_modules} hit modules")
-                break
-                
-            if event_idx == len(events)-1:
-                print(f"No events found with >= {NMinModules} hit modules")
-                run, event = events[0] # Use first event as fallback
+    filename = args.files[0]
+    
+    def render_selected(run, event):
+        if args.views is not None:
+            view_options = {key: value for key, value in scene_options.items() if key != 'cache'}
+            render_multi_view(run, event, filename, args.views or tuple(MULTI_VIEWS),
+                              not args.no_montage, quality(STATIC_IMAGE_SETTINGS), **view_options)
+        elif args.orbit:
+            orbit_options = {key: value for key, value in scene_options.items() if key != 'cache'}
+            render_orbit(run, event, filename, 360., args.orbit, args.workers, quality(ORBIT_SETTINGS),
+                         **orbit_options)
+        elif args.animate:
+            render_time_evolution(run, event, filename, args.animate, quality(TIME_EVOLUTION_SETTINGS),
+                                  **scene_options)
+        else:
+            render_static_image(run, event, filename, quality(STATIC_IMAGE_SETTINGS), **scene_options)
+    
+    if args.run is not None and args.event is not None:
+        render_selected(args.run, args.event)
+    elif args.query:
+        geometry = load_detector_geometry(GEOMETRY_FILE)
+        if args.catalog:
+            catalog = update_catalog(args.catalog, args.files, geometry)
+        else:
+            catalog = EventCatalog()
+            for pulse_file in args.files:
+                catalog.add_file(pulse_file, geometry)
+        items = catalog.query(args.query).items()[:args.limit]
+        render_batch(items, args.workers, quality(STATIC_IMAGE_SETTINGS), **scene_options)
+    else:
+        print(f"Reading events from {filename}")
+        NMinModules = 25
+        # One grouped pass over the file gives a per-event summary table to select from
+        catalog = EventCatalog.from_file(filename, load_detector_geometry(GEOMETRY_FILE))
+        selected = catalog.query(f"n_modules >= {NMinModules}")
+        if len(selected):
+            run, event = selected.events()[0]
+            print(f"Found event {run}, {event} with {selected['n_modules'][0]} hit modules")
+        else:
+            print(f"No events found with >= {NMinModules} hit modules")
+            run, event = catalog.events()[0] # Use first event as fallback
 
-    render_static_image(run, event)
\ No newline at end of file
+        render_selected(run, event)
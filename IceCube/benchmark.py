@@ -0,0 +1,112 @@
+"""Scaling benchmark of the event loaders on synthetic pulse files.
+
+Writes (or reuses) synthetic files of the requested sizes with synthetic.py
+and times each stage the viewers go through:
+
+    index        EventIndex.load without a sidecar: one scan of the Run/Event columns
+                 plus writing the sidecar
+    catalog      EventCatalog.add_file, the per-event summary pass
+    lookup       read_event_pulses of one event via the index
+    aggregate    aggregate_hits of one event
+    time_window  time_window of one event's pulse times
+    markers      dom_marker for every hit DOM of one event (needs manim)
+
+Per-event stages are averaged over a random sample of events.  Run e.g.
+
+    python benchmark.py --sizes 1e3 1e5 1e7 --directory /tmp/eventview-bench --json bench.json
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from catalog import EventCatalog
+from geometry import load_detector_geometry
+from hits import aggregate_hits, time_window
+from pulses import INDEX_SUFFIX, PULSE_DATASET, EventIndex, read_event_pulses, _index_cache
+from synthetic import write_geometry, write_pulses
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def _marker_builder():
+    """Function building the markers of one event, None if manim cannot be imported."""
+    try:
+        from dom_markers import dom_marker
+    except ImportError as err:
+        print(f"Skipping mobject construction: {err}")
+        return None
+
+    def build(hits, geometry):
+        positions = geometry.positions_for(hits.strings, hits.oms)
+        radii = 3. * (0.5 + hits.total_charge / hits.total_charge.max() * 1.5)
+        return [dom_marker(position, radius, '#FFFFFF')
+                for position, radius in zip(positions, radii) if not np.isnan(position[0])]
+    return build
+
+
+def benchmark_file(filename, geometry, n_events=50, seed=0, build_markers=None):
+    """Seconds per stage for one pulse file (per-event stages are means over n_events)."""
+    results = {}
+    if os.path.exists(filename + INDEX_SUFFIX):
+        os.remove(filename + INDEX_SUFFIX)
+    _index_cache.pop((os.path.abspath(filename), PULSE_DATASET), None)
+    # Builds and caches the index, so the catalog pass below does not scan it again
+    results['index'], index = _timed(EventIndex.load, filename)
+    results['catalog'], _ = _timed(EventCatalog.from_file, filename, geometry)
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(index), min(n_events, len(index)), replace=False)
+    stages = ['lookup', 'aggregate', 'time_window'] + (['markers'] if build_markers else [])
+    totals = dict.fromkeys(stages, 0.)
+    for i in sample:
+        seconds, pulses = _timed(read_event_pulses, filename, int(index.runs[i]), int(index.events[i]))
+        totals['lookup'] += seconds
+        seconds, hits = _timed(aggregate_hits, pulses)
+        totals['aggregate'] += seconds
+        totals['time_window'] += _timed(time_window, hits.times)[0]
+        if build_markers and len(hits):
+            totals['markers'] += _timed(build_markers, hits, geometry)[0]
+    for stage in stages:
+        results[stage] = totals[stage] / max(len(sample), 1)
+    results['events'] = len(index)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the event loaders on synthetic files")
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1e3, 1e5, 1e6],
+                        help="pulse rows per file, e.g. 1e3 1e5 1e8")
+    parser.add_argument('--directory', default='synthetic', help="where the synthetic files are kept")
+    parser.add_argument('--events', type=int, default=50, help="events sampled per file for per-event stages")
+    parser.add_argument('--no-markers', action='store_true', help="skip mobject construction")
+    parser.add_argument('--regenerate', action='store_true', help="rewrite existing synthetic files")
+    parser.add_argument('--json', help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    geometry_file = os.path.join(args.directory, 'synthetic_geometry.hdf5')
+    if args.regenerate or not os.path.exists(geometry_file):
+        write_geometry(geometry_file)
+    geometry = load_detector_geometry(geometry_file)
+    build_markers = None if args.no_markers else _marker_builder()
+
+    results = {}
+    for size in args.sizes:
+        filename = os.path.join(args.directory, f'synthetic_{int(size)}.hdf5')
+        if args.regenerate or not os.path.exists(filename):
+            write_pulses(filename, geometry, size)
+        results[int(size)] = benchmark_file(filename, geometry, args.events, build_markers=build_markers)
+
+    stages = ['index', 'catalog', 'lookup', 'aggregate', 'time_window'] + (['markers'] if build_markers else [])
+    print(f"\n{'pulses':>12} {'events':>9}" + ''.join(f" {stage:>12}" for stage in stages))
+    for size, result in results.items():
+        print(f"{size:>12} {result['events']:>9}" +
+              ''.join(f" {result[stage] * 1e3:>10.3f}ms" for stage in stages))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
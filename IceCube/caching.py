@@ -0,0 +1,37 @@
+"""Small helpers shared by the on-disk caches (event index, geometry, ...)."""
+import os
+import zipfile
+import numpy as np
+
+
+def file_fingerprint(filename):
+    """(size, mtime_ns) of a file, used to tell when cached data is stale."""
+    st = os.stat(filename)
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+def atomic_savez(path, compressed=False, **arrays):
+    """np.savez to a temporary name first so readers never see a partial file.
+
+    The temporary name is per process, so processes writing the same file at
+    once each publish a complete copy.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    try:
+        (np.savez_compressed if compressed else np.savez)(tmp, **arrays)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_sidecar(path):
+    """Dict of the arrays in an .npz cache file, or None if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile) as err:
+        print(f"Warning: ignoring unreadable cache file {path}: {err}")
+        return None
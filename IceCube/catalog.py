@@ -0,0 +1,211 @@
+"""Per-event summary table of a pulse file, built in one grouped pass.
+
+Instead of masking the full pulse array once per event, all pulses are sorted
+by (Run, Event, string, om) and every per-event quantity is reduced over the
+event blocks with ufunc.reduceat.  The result is a structured array with one
+row per event that can be filtered with simple predicates, e.g.
+
+    catalog = EventCatalog.from_file(filename, geometry)
+    bright = catalog.query("n_modules >= 25 and total_charge > 50")
+
+Catalogs can span many files (one row per file, run and event) and are saved
+as a compressed columnar .npz together with each file's size and mtime, so
+update_catalog() only processes files that are new or have changed:
+
+    python catalog.py oscNext.catalog.npz oscNext_genie_level7_*.hdf5 --query "n_modules >= 25"
+"""
+import argparse
+import operator
+import os
+import re
+import numpy as np
+from caching import file_fingerprint, atomic_savez
+from pulses import PULSE_DATASET, PULSE_FIELDS, CHUNK_ROWS, EventIndex, event_keys, iter_pulse_chunks
+
+CATALOG_DTYPE = np.dtype([
+    ('file_id', np.int32),  # index into EventCatalog.files
+    ('run', np.int64),
+    ('event', np.int64),
+    ('n_hits', np.int64),
+    ('n_modules', np.int32),
+    ('n_strings', np.int32),
+    ('total_charge', np.float64),
+    ('t_min', np.float64),
+    ('t_max', np.float64),
+    ('time_span', np.float64),
+    ('cog_x', np.float64),  # charge-weighted centroid of the hit modules
+    ('cog_y', np.float64),
+    ('cog_z', np.float64),
+])
+
+_OPERATORS = {
+    '>=': operator.ge, '<=': operator.le, '==': operator.eq,
+    '!=': operator.ne, '>': operator.gt, '<': operator.lt,
+}
+_CLAUSE = re.compile(r'^\s*(\w+)\s*(>=|<=|==|!=|>|<)\s*(\S+)\s*$')
+
+
+def summarize_pulses(pulses, geometry):
+    """CATALOG_DTYPE rows for every event in a structured pulse array."""
+    keys = event_keys(pulses['Run'], pulses['Event'])
+    strings = np.asarray(pulses['string'], dtype=np.int64)
+    oms = np.asarray(pulses['om'], dtype=np.int64)
+    order = np.lexsort((oms, strings, keys))
+    keys, strings, oms = keys[order], strings[order], oms[order]
+    times = np.asarray(pulses['time'], dtype=np.float64)[order]
+    charges = np.asarray(pulses['charge'], dtype=np.float64)[order]
+
+    n_pulses = len(keys)
+    table = np.zeros(0, dtype=CATALOG_DTYPE)
+    if n_pulses == 0:
+        return table
+
+    new_event = np.ones(n_pulses, dtype=bool)
+    new_event[1:] = keys[1:] != keys[:-1]
+    new_string = new_event.copy()
+    new_string[1:] |= strings[1:] != strings[:-1]
+    new_module = new_string.copy()
+    new_module[1:] |= oms[1:] != oms[:-1]
+    starts = np.flatnonzero(new_event)
+
+    table = np.zeros(len(starts), dtype=CATALOG_DTYPE)
+    table['run'] = keys[starts] >> 32
+    table['event'] = keys[starts] & 0xFFFFFFFF
+    table['n_hits'] = np.diff(np.append(starts, n_pulses))
+    table['n_modules'] = np.add.reduceat(new_module, starts, dtype=np.int64)
+    table['n_strings'] = np.add.reduceat(new_string, starts, dtype=np.int64)
+    table['total_charge'] = np.add.reduceat(charges, starts)
+    table['t_min'] = np.minimum.reduceat(times, starts)
+    table['t_max'] = np.maximum.reduceat(times, starts)
+    table['time_span'] = table['t_max'] - table['t_min']
+
+    # Modules missing from the geometry get no weight in the centroid
+    positions = geometry.positions_for(strings, oms)
+    weights = np.where(np.isnan(positions[:, 0]), 0., charges)
+    positions = np.nan_to_num(positions)
+    weight_sums = np.add.reduceat(weights, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for axis, name in enumerate(('cog_x', 'cog_y', 'cog_z')):
+            table[name] = np.add.reduceat(weights * positions[:, axis], starts) / weight_sums
+    return table
+
+
+class EventCatalog:
+    def __init__(self, table=None, files=(), fingerprints=None):
+        self.table = np.zeros(0, dtype=CATALOG_DTYPE) if table is None else table
+        self.files = list(files)
+        self.fingerprints = (np.zeros((0, 2), dtype=np.int64) if fingerprints is None
+                             else np.asarray(fingerprints, dtype=np.int64).reshape(-1, 2))
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, field):
+        return self.table[field]
+
+    @classmethod
+    def from_file(cls, filename, geometry, dataset=PULSE_DATASET):
+        catalog = cls()
+        catalog.add_file(filename, geometry, dataset)
+        return catalog
+
+    def add_file(self, filename, geometry, dataset=PULSE_DATASET, chunk_rows=CHUNK_ROWS):
+        """Catalogue a file unless it is already present and unchanged.
+
+        Returns True if the file was (re)processed.
+        """
+        path = os.path.abspath(filename)
+        fingerprint = file_fingerprint(path)
+        if path in self.files:
+            file_id = self.files.index(path)
+            if np.array_equal(self.fingerprints[file_id], fingerprint):
+                return False
+            # Changed since it was catalogued: drop its old rows
+            self.table = self.table[self.table['file_id'] != file_id]
+            self.fingerprints[file_id] = fingerprint
+        else:
+            file_id = len(self.files)
+            self.files.append(path)
+            self.fingerprints = np.vstack((self.fingerprints, fingerprint))
+
+        print(f"Building event catalog for {filename}...")
+        # Stream the file in chunks of whole events so memory stays bounded
+        row_ranges = EventIndex.load(path, dataset).event_ranges(chunk_rows)
+        chunks = iter_pulse_chunks(path, PULSE_FIELDS, compact=True, row_ranges=row_ranges,
+                                   dataset=dataset)
+        rows = np.concatenate([np.zeros(0, dtype=CATALOG_DTYPE)] +
+                              [summarize_pulses(chunk, geometry) for chunk in chunks])
+        rows['file_id'] = file_id
+        self.table = np.concatenate((self.table, rows))
+        print(f"Catalogued {len(rows)} events")
+        return True
+
+    def save(self, path):
+        columns = {f'col_{name}': self.table[name] for name in CATALOG_DTYPE.names}
+        atomic_savez(path, compressed=True, files=np.array(self.files, dtype=str),
+                     fingerprints=self.fingerprints, **columns)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            n_rows = len(data['col_run'])
+            table = np.zeros(n_rows, dtype=CATALOG_DTYPE)
+            for name in CATALOG_DTYPE.names:
+                table[name] = data[f'col_{name}']
+            return cls(table, data['files'].tolist(), data['fingerprints'])
+
+    def where(self, mask):
+        return type(self)(self.table[mask], self.files, self.fingerprints)
+
+    def mask(self, expression):
+        """Boolean mask for clauses like "n_modules >= 25 and n_strings > 2"."""
+        mask = np.ones(len(self.table), dtype=bool)
+        for clause in re.split(r'\s+and\s+', expression.strip(), flags=re.IGNORECASE):
+            match = _CLAUSE.match(clause)
+            if match is None or match.group(1) not in self.table.dtype.names:
+                raise ValueError(f"Cannot parse catalog query clause: {clause!r}")
+            field, op, value = match.groups()
+            mask &= _OPERATORS[op](self.table[field], float(value))
+        return mask
+
+    def query(self, expression):
+        return self.where(self.mask(expression))
+
+    def events(self):
+        """List of (run, event) pairs in catalog order."""
+        return list(zip(self.table['run'].tolist(), self.table['event'].tolist()))
+
+    def items(self):
+        """List of (filename, run, event) triples in catalog order."""
+        return [(self.files[file_id], run, event) for file_id, run, event in
+                zip(self.table['file_id'].tolist(), self.table['run'].tolist(),
+                    self.table['event'].tolist())]
+
+
+def update_catalog(catalog_path, filenames, geometry, dataset=PULSE_DATASET):
+    """Load the catalog at catalog_path, add new/changed files and save it back."""
+    if os.path.exists(catalog_path):
+        catalog = EventCatalog.load(catalog_path)
+    else:
+        catalog = EventCatalog()
+    changed = [catalog.add_file(filename, geometry, dataset) for filename in filenames]
+    if any(changed) or not os.path.exists(catalog_path):
+        catalog.save(catalog_path)
+    print(f"Catalog {catalog_path}: {len(catalog)} events from {len(catalog.files)} files "
+          f"({sum(changed)} processed)")
+    return catalog
+
+
+if __name__ == "__main__":
+    from geometry import load_detector_geometry, GEOMETRY_FILE
+
+    parser = argparse.ArgumentParser(description="Build or update a multi-file event catalog")
+    parser.add_argument('catalog', help="catalog .npz file (created if missing)")
+    parser.add_argument('files', nargs='*', help="pulse HDF5 files to add")
+    parser.add_argument('--query', help='e.g. "n_modules >= 25 and n_strings > 2"')
+    args = parser.parse_args()
+
+    catalog = update_catalog(args.catalog, args.files, load_detector_geometry(GEOMETRY_FILE))
+    if args.query:
+        for filename, run, event in catalog.query(args.query).items():
+            print(f"{filename} {run} {event}")
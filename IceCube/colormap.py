@@ -0,0 +1,55 @@
+"""Lookup-table version of the time colour scale used by the event viewers.
+
+The viewers colour each DOM by its hit time on a RED -> ORANGE -> YELLOW ->
+GREEN -> BLUE -> PURPLE ramp, clamping times before/after the event's time
+window to RED/PURPLE.  TimeColormap samples that ramp once into an RGB table,
+so a whole array of DOM times is coloured with one indexing operation.
+
+Only colors() needs manim; the RGB table itself does not, so NumPy/PIL tools
+such as preview.py can use it without importing manim.
+"""
+import numpy as np
+
+# manim's RED, ORANGE, YELLOW, GREEN, BLUE, PURPLE
+TIME_COLORS = ['#FC6255', '#FF862F', '#FFFF00', '#83C167', '#58C4DD', '#9A72AC']
+
+
+def hex_to_rgb(color):
+    """Float RGB in [0, 1] of a '#RRGGBB' colour."""
+    color = color.lstrip('#')
+    return np.array([int(color[i:i + 2], 16) for i in (0, 2, 4)], dtype=np.float64) / 255
+
+
+class TimeColormap:
+    def __init__(self, colors=TIME_COLORS, size=1024):
+        anchors = np.array([hex_to_rgb(str(color)) for color in colors], dtype=np.float64)
+        # Same piecewise-linear RGB interpolation as interpolate_color between anchors
+        samples = np.linspace(0, len(anchors) - 1, size)
+        self.lut = np.column_stack([np.interp(samples, np.arange(len(anchors)), anchors[:, ch])
+                                    for ch in range(3)])
+
+    def __len__(self):
+        return len(self.lut)
+
+    def lut_indices(self, times, time_min, time_max):
+        """LUT row for each time; times outside the window clamp to the ends."""
+        times = np.asarray(times, dtype=np.float64)
+        span = time_max - time_min
+        if span <= 0:
+            t = np.where(times > time_max, 1., 0.)
+        else:
+            t = (times - time_min) / span
+        return np.clip(np.rint(t * (len(self.lut) - 1)), 0, len(self.lut) - 1).astype(np.intp)
+
+    def rgb(self, times, time_min, time_max):
+        """(M, 3) float RGB in [0, 1] for an array of times."""
+        return self.lut[self.lut_indices(times, time_min, time_max)]
+
+    def colors(self, times, time_min, time_max):
+        """Manim colours for an array of times, for use with set_color."""
+        from manim import rgb_to_color
+        return [rgb_to_color(rgb) for rgb in self.rgb(times, time_min, time_max)]
+
+    def ramp(self, n):
+        """n evenly spaced RGB samples of the full scale, e.g. for a legend bar."""
+        return self.lut[np.linspace(0, len(self.lut) - 1, n).round().astype(np.intp)]
@@ -0,0 +1,33 @@
+"""Whole-detector context layer drawn as point clouds instead of spheres.
+
+Drawing every one of the ~5000 modules as its own Sphere makes the unhit
+detector cost far more than the event itself.  DetectorPointCloud draws all
+module positions from an (N, 3) array as point-cloud mobjects, one per distinct
+point size (a PMobject has a single stroke width), with a colour per point.
+"""
+import numpy as np
+from manim import Mobject, PMobject, GREY, color_to_rgb
+
+
+class DetectorPointCloud(Mobject):
+    def __init__(self, positions, colors=GREY, sizes=2, opacity=1.0, **kwargs):
+        """positions: (N, 3); colors: one colour, a list of N colours or (N, 3) RGB;
+        sizes: point size in pixels, scalar or (N,)."""
+        super().__init__(**kwargs)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        n_points = len(positions)
+
+        if isinstance(colors, np.ndarray) and colors.ndim == 2:
+            rgbs = colors[:, :3].astype(np.float64)
+        elif isinstance(colors, (list, tuple)):
+            rgbs = np.array([color_to_rgb(color) for color in colors], dtype=np.float64)
+        else:
+            rgbs = np.tile(color_to_rgb(colors), (n_points, 1))
+        rgbas = np.column_stack((rgbs, np.full(n_points, opacity)))
+
+        sizes = np.broadcast_to(np.rint(sizes).astype(int), (n_points,))
+        for size in np.unique(sizes):
+            in_layer = sizes == size
+            layer = PMobject(stroke_width=int(size))
+            layer.add_points(positions[in_layer], rgbas=rgbas[in_layer])
+            self.add(layer)
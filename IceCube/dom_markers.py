@@ -0,0 +1,234 @@
+"""Reusable DOM marker spheres with resolution picked from their size on screen.
+
+Building a Sphere evaluates its parametric surface and creates one face per
+(u, v) patch, which dominated scene construction when every hit DOM got a fresh
+32x32 sphere.  Here one unit sphere per resolution level is built once and
+copied, scaled, moved and recoloured for each DOM.  The resolution is the
+lowest level whose silhouette stays within half a pixel of a true circle at
+the DOM's projected pixel radius, so small or distant DOMs get far fewer faces
+while large ones keep the full 32x32.
+
+DOMMarkerPool keeps the state of every geometry row for a whole scene, and
+hands its markers from DOMs that are hidden to DOMs that appear, so a
+multi-event reel changes the radius, colour and opacity of existing markers
+between events instead of building and fading out a new group every time.
+"""
+from collections import defaultdict
+from functools import lru_cache
+import numpy as np
+from manim import Animation, Sphere, VGroup, WHITE, config, rgb_to_color
+
+# Available (u, v) resolutions, coarsest first; the finest matches the original markers
+RESOLUTION_LEVELS = (8, 12, 16, 24, 32)
+
+# Radius hidden pool markers shrink to (a marker is never scaled to zero)
+HIDDEN_RADIUS = 1e-2
+
+
+@lru_cache(maxsize=None)
+def unit_sphere(resolution):
+    return Sphere(radius=1, resolution=(resolution, resolution))
+
+
+def camera_direction(phi, theta):
+    """Unit vector from the scene origin towards a ThreeDCamera at (phi, theta)."""
+    return np.array([np.sin(phi) * np.cos(theta), np.sin(phi) * np.sin(theta), np.cos(phi)])
+
+
+def projected_pixel_radius(radii, depths=0., focal_distance=None, pixel_width=None,
+                           frame_width=None, zoom=1.):
+    """Approximate on-screen radius in pixels of spheres at the given camera depths.
+
+    depths are distances towards the camera along its viewing axis (the z
+    coordinate after the camera rotation); with a focal_distance the
+    ThreeDCamera perspective factor focal / (focal - depth) is applied.
+    """
+    pixel_width = config.pixel_width if pixel_width is None else pixel_width
+    frame_width = config.frame_width if frame_width is None else frame_width
+    radii = np.asarray(radii, dtype=np.float64) * zoom * pixel_width / frame_width
+    if focal_distance is None:
+        return radii
+    depths = np.asarray(depths, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        factor = np.where(depths < focal_distance, focal_distance / (focal_distance - depths), np.inf)
+    return radii * factor
+
+
+def marker_resolutions(pixel_radii, max_resolution=RESOLUTION_LEVELS[-1]):
+    """Resolution level for each projected pixel radius."""
+    pixel_radii = np.asarray(pixel_radii, dtype=np.float64)
+    # Polygon with n sides deviates from its circle by r * (1 - cos(pi / n)) <= 0.5 px
+    with np.errstate(divide='ignore', invalid='ignore'):
+        needed = np.where(pixel_radii > 0.5, np.pi / np.arccos(1 - 0.5 / pixel_radii), 0.)
+    levels = np.array([level for level in RESOLUTION_LEVELS if level <= max_resolution])
+    picked = np.searchsorted(levels, np.nan_to_num(needed, posinf=levels[-1]))
+    return levels[np.minimum(picked, len(levels) - 1)]
+
+
+def dom_marker(position, radius, color, resolution=RESOLUTION_LEVELS[-1], shading=True):
+    """Sphere marker for one DOM, copied from the cached unit sphere."""
+    marker = unit_sphere(int(resolution)).copy()
+    marker.scale(radius)
+    marker.move_to(position)
+    marker.set_color(color)
+    marker.set_opacity(1.0)
+    if shading:
+        marker.set_gloss(0.5)
+        marker.set_shadow(0.2)
+    return marker
+
+
+class DOMMarkerPool(VGroup):
+    """Persistent DOM markers, one slot per row of positions (e.g. geometry rows).
+
+    The state of every slot is kept in the radii, rgbs and opacities arrays;
+    transition() animates the pool to a new event and set_state() jumps to it.
+    Only shown slots hold a marker.  When a slot is hidden its marker leaves
+    the group and goes on a free list, and the next slot shown at the same
+    resolution takes it over, so the pool never holds more markers than the
+    most DOMs shown at once (both events during a transition) rather than one
+    per module.
+
+    A marker's resolution comes from its radius when it is shown, projected
+    like StaticDetectorVisualization does with the slots' depths towards the
+    camera and focal_distance (no perspective if that is None).
+    """
+
+    def __init__(self, positions, max_resolution=RESOLUTION_LEVELS[-1], shading=True, depths=0.,
+                 focal_distance=None, **kwargs):
+        super().__init__(**kwargs)
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        n_slots = len(self.positions)
+        self.max_resolution = max_resolution
+        self.shading = shading
+        self.depths = np.broadcast_to(np.asarray(depths, dtype=np.float64), (n_slots,))
+        self.focal_distance = focal_distance
+        self.markers = [None] * n_slots
+        self.resolutions = np.zeros(n_slots, dtype=np.int64)
+        # resolution -> [(marker, radius)] of markers no slot is using
+        self.free_markers = defaultdict(list)
+        self.shown = np.zeros(n_slots, dtype=bool)
+        self.radii = np.full(n_slots, HIDDEN_RADIUS)
+        self.rgbs = np.ones((n_slots, 3))
+        self.opacities = np.zeros(n_slots)
+
+    def target_state(self, slots, radii, rgbs):
+        """Full (radii, rgbs, opacities) arrays with only the given slots visible."""
+        target_radii = np.full(len(self.positions), HIDDEN_RADIUS)
+        target_rgbs = self.rgbs.copy()
+        target_opacities = np.zeros(len(self.positions))
+        target_radii[slots] = radii
+        target_rgbs[slots] = rgbs
+        target_opacities[slots] = 1.
+        return target_radii, target_rgbs, target_opacities
+
+    def transition(self, slots, radii, rgbs, **kwargs):
+        """Animation from the current state to showing slots with these radii and RGB colours."""
+        return DOMMarkerTransition(self, slots, radii, rgbs, **kwargs)
+
+    def set_state(self, slots, radii, rgbs):
+        radii, rgbs, opacities = self.target_state(slots, radii, rgbs)
+        changed = self.changed_slots(radii, rgbs, opacities)
+        self.show_slots(changed, radii[changed])
+        self.apply(changed, radii[changed], rgbs[changed], opacities[changed])
+        self.hide_invisible()
+        return self
+
+    def changed_slots(self, radii, rgbs, opacities):
+        return np.flatnonzero((radii != self.radii) | (opacities != self.opacities) |
+                              np.any(rgbs != self.rgbs, axis=1))
+
+    def marker_count(self):
+        """Number of markers the pool holds, shown or free."""
+        return int(np.count_nonzero(self.shown)) + sum(len(free) for free in self.free_markers.values())
+
+    def show_slots(self, slots, radii):
+        """Give slots about to be shown at the given radii a marker and put it into the group.
+
+        Markers come from the free list of their resolution, or are built if it is empty.
+        """
+        slots = np.asarray(slots, dtype=np.intp)
+        new = ~self.shown[slots]
+        slots = slots[new]
+        if not len(slots):
+            return
+        resolutions = marker_resolutions(
+            projected_pixel_radius(np.asarray(radii, dtype=np.float64)[new], self.depths[slots],
+                                   self.focal_distance), self.max_resolution)
+        markers = []
+        for slot, resolution in zip(slots.tolist(), resolutions.tolist()):
+            free = self.free_markers[resolution]
+            if free:
+                marker, radius = free.pop()
+                marker.scale(self.radii[slot] / radius)
+                marker.move_to(self.positions[slot])
+            else:
+                # Replaces a free marker of another resolution, if any, so the pool does not grow
+                other = next((markers for markers in self.free_markers.values() if markers), None)
+                if other:
+                    other.pop()
+                marker = dom_marker(self.positions[slot], self.radii[slot], WHITE, resolution,
+                                    self.shading)
+            marker.set_opacity(0.)
+            self.markers[slot] = marker
+            markers.append(marker)
+        self.add(*markers)
+        self.resolutions[slots] = resolutions
+        self.shown[slots] = True
+
+    def hide_invisible(self):
+        """Take fully transparent markers out of the group and put them on the free lists."""
+        hidden = np.flatnonzero(self.shown & (self.opacities == 0))
+        if not len(hidden):
+            return
+        self.remove(*[self.markers[slot] for slot in hidden.tolist()])
+        for slot in hidden.tolist():
+            free = self.free_markers[int(self.resolutions[slot])]
+            free.append((self.markers[slot], self.radii[slot]))
+            self.markers[slot] = None
+        self.shown[hidden] = False
+
+    def apply(self, slots, radii, rgbs, opacities):
+        """Set the state of the given (shown) slots."""
+        for slot, radius, rgb, opacity in zip(slots.tolist(), radii.tolist(), rgbs, opacities.tolist()):
+            marker = self.markers[slot]
+            marker.scale(radius / self.radii[slot])
+            marker.set_color(rgb_to_color(rgb))
+            marker.set_opacity(opacity)
+        self.radii[slots] = radii
+        self.rgbs[slots] = rgbs
+        self.opacities[slots] = opacities
+
+
+class DOMMarkerTransition(Animation):
+    """Interpolate a DOMMarkerPool's radius, colour and opacity arrays to a new event."""
+
+    def __init__(self, pool, slots, radii, rgbs, **kwargs):
+        super().__init__(pool, **kwargs)
+        self.target = (np.asarray(slots, dtype=np.intp), np.asarray(radii, dtype=np.float64),
+                       np.asarray(rgbs, dtype=np.float64))
+
+    def begin(self):
+        pool = self.mobject
+        end_radii, end_rgbs, end_opacities = pool.target_state(*self.target)
+        # Markers that appear keep their new colour while they grow and fade in
+        appearing = (pool.opacities == 0) & (end_opacities > 0)
+        pool.rgbs[appearing] = end_rgbs[appearing]
+        self.slots = pool.changed_slots(end_radii, end_rgbs, end_opacities)
+        pool.show_slots(self.slots, end_radii[self.slots])
+        self.start = (pool.radii[self.slots], pool.rgbs[self.slots], pool.opacities[self.slots])
+        self.end = (end_radii[self.slots], end_rgbs[self.slots], end_opacities[self.slots])
+        super().begin()
+
+    def create_starting_mobject(self):
+        # The start state is kept in arrays, so no copy of the whole pool is needed
+        return self.mobject
+
+    def interpolate_mobject(self, alpha):
+        alpha = self.rate_func(alpha)
+        self.mobject.apply(self.slots, *[start + (end - start) * alpha
+                                         for start, end in zip(self.start, self.end)])
+
+    def finish(self):
+        super().finish()
+        self.mobject.hide_invisible()
@@ -0,0 +1,150 @@
+"""Array-backed IceCube detector geometry.
+
+The geometry file stores one row per module in a 2D 'geo' dataset whose
+columns are named by 'labels' (string, om, pos_x, pos_y, pos_z).  Instead of a
+dict of (string, om) -> tuple, DetectorGeometry keeps the columns as
+contiguous NumPy arrays plus a dense (string, om) -> row table, so positions
+for a whole event are looked up with a single fancy-indexing call.
+
+load_detector_geometry() caches the parsed geometry per process, and in a
+compiled .npz next to the HDF5 file, keyed by the file's path, size and mtime.
+publish_geometry()/attach_geometry() hand the arrays to worker processes as
+memory-mapped .npy files.
+"""
+import os
+import h5py
+import numpy as np
+from caching import file_fingerprint, atomic_savez, load_sidecar
+from shared_arrays import publish_arrays, attach_arrays
+
+GEOMETRY_FILE = 'GeoCalibDetectorStatus_AVG_55697-57531_PASS2_SPE_withScaledNoise.hdf5'
+COMPILED_SUFFIX = '.geometry.npz'
+
+# In-process cache: (abs path, size, mtime_ns) -> DetectorGeometry
+_geometry_cache = {}
+
+
+class DetectorGeometry:
+    def __init__(self, strings, oms, positions):
+        self.strings = np.ascontiguousarray(strings, dtype=np.int32)
+        self.oms = np.ascontiguousarray(oms, dtype=np.int32)
+        self.positions = np.ascontiguousarray(positions, dtype=np.float64).reshape(-1, 3)
+
+        # Dense lookup table, -1 where a (string, om) slot has no module
+        n_strings = int(self.strings.max()) + 1 if len(self.strings) else 0
+        n_oms = int(self.oms.max()) + 1 if len(self.oms) else 0
+        self.row_table = np.full((n_strings, n_oms), -1, dtype=np.int32)
+        self.row_table[self.strings, self.oms] = np.arange(len(self.strings), dtype=np.int32)
+
+        # Row of the lowest-numbered module on each string (gives the string's x, y)
+        has_module = self.row_table >= 0
+        first_om = np.argmax(has_module, axis=1)
+        self.string_rows = np.where(has_module.any(axis=1),
+                                    self.row_table[np.arange(n_strings), first_om], -1)
+
+    @classmethod
+    def from_hdf5(cls, filename=GEOMETRY_FILE):
+        with h5py.File(filename, 'r') as f:
+            geo_data = f['geo'][:]
+            labels = [label.decode('utf-8') for label in f['labels']]
+        col_indices = {label: idx for idx, label in enumerate(labels)}
+        strings = geo_data[:, col_indices['string']].astype(np.int32)
+        oms = geo_data[:, col_indices['om']].astype(np.int32)
+        positions = geo_data[:, [col_indices['pos_x'], col_indices['pos_y'], col_indices['pos_z']]]
+        return cls(strings, oms, positions)
+
+    def to_arrays(self):
+        return {'strings': self.strings, 'oms': self.oms, 'positions': self.positions}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['strings'], arrays['oms'], arrays['positions'])
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, key):
+        string, om = key
+        return bool(self.rows_for(string, om) >= 0)
+
+    def rows_for(self, strings, oms):
+        """Geometry row of each (string, om), -1 where the module is unknown."""
+        strings = np.asarray(strings, dtype=np.int64)
+        oms = np.asarray(oms, dtype=np.int64)
+        n_strings, n_oms = self.row_table.shape
+        valid = (strings >= 0) & (strings < n_strings) & (oms >= 0) & (oms < n_oms)
+        rows = np.full(np.broadcast(strings, oms).shape, -1, dtype=np.int32)
+        rows[valid] = self.row_table[strings[valid], oms[valid]]
+        return rows
+
+    def contains(self, strings, oms):
+        return self.rows_for(strings, oms) >= 0
+
+    def positions_for(self, strings, oms):
+        """(M, 3) positions of the given modules; rows of unknown modules are NaN."""
+        rows = self.rows_for(strings, oms)
+        positions = self.positions[np.maximum(rows, 0)]
+        positions[rows < 0] = np.nan
+        return positions
+
+    def position(self, string, om):
+        row = int(self.rows_for(string, om))
+        if row < 0:
+            raise KeyError((string, om))
+        return self.positions[row]
+
+    def string_xy(self, strings):
+        """(M, 2) x, y of each string, taken from its lowest-numbered module."""
+        strings = np.asarray(strings, dtype=np.int64)
+        valid = (strings >= 0) & (strings < len(self.string_rows))
+        rows = np.full(strings.shape, -1, dtype=np.int32)
+        rows[valid] = self.string_rows[strings[valid]]
+        xy = self.positions[np.maximum(rows, 0), :2]
+        xy[rows < 0] = np.nan
+        return xy
+
+
+def load_detector_geometry(filename=GEOMETRY_FILE, compiled=True):
+    """DetectorGeometry for a geometry file, parsed at most once per process.
+
+    With compiled=True the parsed arrays are also kept in a <file>.geometry.npz
+    sidecar, so a fresh process skips the HDF5 parsing as well.
+    """
+    path = os.path.abspath(filename)
+    fingerprint = file_fingerprint(path)
+    key = (path,) + tuple(int(x) for x in fingerprint)
+    geometry = _geometry_cache.get(key)
+    if geometry is not None:
+        return geometry
+
+    compiled_path = path + COMPILED_SUFFIX
+    # A sidecar that cannot be read is rebuilt, like one of another file version
+    data = load_sidecar(compiled_path) if compiled else None
+    if data is not None and np.array_equal(data.get('fingerprint'), fingerprint):
+        geometry = DetectorGeometry.from_arrays(data)
+    if geometry is None:
+        geometry = DetectorGeometry.from_hdf5(path)
+        if compiled:
+            try:
+                atomic_savez(compiled_path, fingerprint=fingerprint, **geometry.to_arrays())
+            except OSError as err:
+                print(f"Warning: could not write compiled geometry {compiled_path}: {err}")
+    _geometry_cache[key] = geometry
+    return geometry
+
+
+def publish_geometry(directory, filename=GEOMETRY_FILE):
+    """Publish the geometry arrays for attach_geometry() in other processes."""
+    path = os.path.abspath(filename)
+    geometry = load_detector_geometry(path)
+    publish_arrays(directory, path=np.array([path]), fingerprint=file_fingerprint(path),
+                   **geometry.to_arrays())
+
+
+def attach_geometry(directory):
+    """Map published geometry arrays and make load_detector_geometry() return them."""
+    arrays = attach_arrays(directory)
+    key = (str(arrays['path'][0]),) + tuple(int(x) for x in arrays['fingerprint'])
+    geometry = DetectorGeometry.from_arrays(arrays)
+    _geometry_cache[key] = geometry
+    return geometry
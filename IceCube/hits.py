@@ -0,0 +1,129 @@
+"""Per-DOM aggregation of an event's pulses.
+
+aggregate_hits() sorts the pulses by (string, om, time) once and reduces each
+module's block with np.add.reduceat, giving per-DOM arrays instead of a dict of
+(time, charge) tuples that has to be walked again for every quantity.
+time_window() finds the colour-scale time window of an event in O(n log n).
+cumulative_charge() tabulates each DOM's charge collected up to a set of frame
+times, for animating an event's light deposition.
+"""
+import numpy as np
+
+
+class DOMHits:
+    """Per-DOM summary of one event, one entry per hit module.
+
+    strings, oms        module ids, sorted by (string, om)
+    total_charge        summed pulse charge
+    mean_time           unweighted mean pulse time
+    first_time          earliest pulse time
+    n_hits              number of pulses
+
+    The pulses themselves are kept sorted by (string, om, time) in times and
+    charges, with module i owning times[starts[i]:starts[i] + n_hits[i]].
+    """
+
+    def __init__(self, strings, oms, total_charge, mean_time, first_time, n_hits,
+                 times, charges, starts):
+        self.strings = strings
+        self.oms = oms
+        self.total_charge = total_charge
+        self.mean_time = mean_time
+        self.first_time = first_time
+        self.n_hits = n_hits
+        self.times = times
+        self.charges = charges
+        self.starts = starts
+
+    def __len__(self):
+        return len(self.strings)
+
+    @property
+    def n_pulses(self):
+        return len(self.times)
+
+    @property
+    def dom_index(self):
+        """Index of the owning DOM for every pulse in times/charges."""
+        return np.repeat(np.arange(len(self.strings)), self.n_hits)
+
+
+def aggregate_hits(pulses):
+    """Group a structured pulse array (string, om, time, charge) into DOMHits."""
+    strings = np.asarray(pulses['string'], dtype=np.int32)
+    oms = np.asarray(pulses['om'], dtype=np.int32)
+    times = np.asarray(pulses['time'], dtype=np.float64)
+    charges = np.asarray(pulses['charge'], dtype=np.float64)
+
+    order = np.lexsort((times, oms, strings))
+    strings, oms = strings[order], oms[order]
+    times, charges = times[order], charges[order]
+
+    n_pulses = len(times)
+    new_dom = np.ones(n_pulses, dtype=bool)
+    new_dom[1:] = (strings[1:] != strings[:-1]) | (oms[1:] != oms[:-1])
+    starts = np.flatnonzero(new_dom)
+    n_hits = np.diff(np.append(starts, n_pulses))
+
+    if n_pulses:
+        total_charge = np.add.reduceat(charges, starts)
+        mean_time = np.add.reduceat(times, starts) / n_hits
+    else:
+        total_charge = np.zeros(0)
+        mean_time = np.zeros(0)
+
+    return DOMHits(strings[starts], oms[starts], total_charge, mean_time, times[starts],
+                   n_hits, times, charges, starts)
+
+
+def time_window(times, containment=0.9, weights=None):
+    """Shortest time interval holding a fraction `containment` of the hits.
+
+    times can be the raw pulse times or an already aggregated array (e.g. the
+    per-DOM mean times).  The interval holds more than containment * n hits
+    (int(containment * n) + 1, as in the original scan).  With weights (e.g.
+    charges) it must hold more than that fraction of the total weight instead,
+    so uniform weights give the same window as no weights.
+    Returns (time_min, time_max); (0, 1) if there are no times.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    n_hits = len(times)
+    if n_hits == 0:
+        return 0., 1.
+
+    order = np.argsort(times, kind='stable')
+    sorted_times = times[order]
+    if weights is None:
+        # Window spanning hits i .. i + k, as in the original scan
+        k = min(int(containment * n_hits), n_hits - 1)
+        if k == 0:
+            return float(sorted_times[0]), float(sorted_times[0])
+        i = np.argmin(sorted_times[k:] - sorted_times[:-k])
+        return float(sorted_times[i]), float(sorted_times[i + k])
+
+    sorted_weights = np.asarray(weights, dtype=np.float64)[order]
+    cumulative = np.concatenate(([0.], np.cumsum(sorted_weights)))
+    # For each start i, the first end j with weight(i..j) > containment * total; like the
+    # unweighted window of int(containment * n) + 1 hits, so uniform weights give the same result
+    ends = np.searchsorted(cumulative, cumulative[:-1] + containment * cumulative[-1], side='right') - 1
+    valid = ends < n_hits
+    if not np.any(valid):
+        return float(sorted_times[0]), float(sorted_times[-1])
+    starts = np.flatnonzero(valid)
+    ends = np.maximum(ends[valid], starts)
+    i = np.argmin(sorted_times[ends] - sorted_times[starts])
+    return float(sorted_times[starts[i]]), float(sorted_times[ends[i]])
+
+
+def cumulative_charge(hits, frame_times):
+    """(n_doms, n_frames) charge each DOM of a DOMHits has collected by each frame time.
+
+    frame_times must be increasing.  A pulse counts from the first frame at or
+    after its time; pulses later than the last frame time are counted there, so
+    the last column is the DOMs' total charge.
+    """
+    frame_times = np.asarray(frame_times, dtype=np.float64)
+    frames = np.minimum(np.searchsorted(frame_times, hits.times, side='left'), len(frame_times) - 1)
+    charge = np.zeros((len(hits), len(frame_times)))
+    np.add.at(charge, (hits.dom_index, frames), hits.charges)
+    return np.cumsum(charge, axis=1, out=charge)
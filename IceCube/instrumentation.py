@@ -0,0 +1,149 @@
+"""Stage-level timing and memory records for the event pipeline.
+
+Set EVENTVIEW_PROFILE to a file name and every instrumented stage appends one
+JSON line to it with its wall time, resident memory and object counts:
+
+    EVENTVIEW_PROFILE=profile.jsonl python EventView-V06.py --query "n_modules >= 25"
+    python instrumentation.py profile.jsonl
+
+Stages are marked with the instrumented() decorator or the stage() context
+manager; nested stages are recorded with their path (e.g.
+"create_visualization/process_event"), and context() adds fields such as the
+run and event to every record inside it.  Each process appends its own lines,
+so batch workers can share one file.  With the variable unset nothing is
+measured or written.
+"""
+import argparse
+import functools
+import gc
+import json
+import os
+import resource
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+PROFILE_ENV = 'EVENTVIEW_PROFILE'
+
+_stack = []
+_context = {}
+
+
+def profile_path():
+    return os.environ.get(PROFILE_ENV) or None
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (None where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10  # bytes on macOS, kB on Linux
+
+
+def count_mobjects(scene):
+    """Number of mobjects (with submobjects) in a scene, None if it is not a scene."""
+    family = getattr(scene, 'get_mobject_family_members', None)
+    return len(family()) if family is not None else None
+
+
+@contextmanager
+def context(**fields):
+    """Add fields (e.g. run=..., event=...) to every record written inside this block."""
+    saved = dict(_context)
+    _context.update(fields)
+    try:
+        yield
+    finally:
+        _context.clear()
+        _context.update(saved)
+
+
+@contextmanager
+def stage(name, scene=None, **fields):
+    """Record the wall time, memory and object counts of the enclosed block."""
+    path = profile_path()
+    if path is None:
+        yield
+        return
+
+    _stack.append(name)
+    rss_start, peak_start = current_rss_mb(), peak_rss_mb()
+    objects_start = len(gc.get_objects())
+    mobjects_start = count_mobjects(scene)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        rss_end, peak_end = current_rss_mb(), peak_rss_mb()
+        record = dict(_context)
+        record.update(fields)
+        record.update({
+            'stage': '/'.join(_stack),
+            'pid': os.getpid(),
+            'wall_s': round(wall, 6),
+            'rss_mb': None if rss_end is None else round(rss_end, 2),
+            'rss_delta_mb': None if rss_end is None or rss_start is None else round(rss_end - rss_start, 2),
+            'peak_rss_mb': round(peak_end, 2),
+            'peak_rss_increase_mb': round(peak_end - peak_start, 2),
+            'objects_delta': len(gc.get_objects()) - objects_start,
+        })
+        if scene is not None:
+            mobjects_end = count_mobjects(scene)
+            record['mobjects'] = mobjects_end
+            if mobjects_start is not None:
+                record['mobjects_delta'] = mobjects_end - mobjects_start
+        _stack.pop()
+        with open(path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+
+def instrumented(name=None):
+    """Decorator recording each call as a stage; scenes passed as self get mobject counts."""
+    def decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if profile_path() is None:
+                return func(*args, **kwargs)
+            scene = args[0] if args and hasattr(args[0], 'get_mobject_family_members') else None
+            with stage(label, scene):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def summarize(path):
+    """Per-stage totals of a profile file as {stage: {...}}."""
+    stages = defaultdict(lambda: {'calls': 0, 'wall_s': 0., 'max_wall_s': 0., 'max_peak_rss_mb': 0.})
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            summary = stages[record['stage']]
+            summary['calls'] += 1
+            summary['wall_s'] += record['wall_s']
+            summary['max_wall_s'] = max(summary['max_wall_s'], record['wall_s'])
+            summary['max_peak_rss_mb'] = max(summary['max_peak_rss_mb'], record['peak_rss_mb'])
+    return dict(stages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize an EVENTVIEW_PROFILE file by stage")
+    parser.add_argument('profile', help="JSON lines written with EVENTVIEW_PROFILE set")
+    args = parser.parse_args()
+
+    print(f"{'stage':<50} {'calls':>6} {'total s':>10} {'mean s':>10} {'max s':>10} {'peak MB':>9}")
+    for name, summary in sorted(summarize(args.profile).items(), key=lambda item: -item[1]['wall_s']):
+        print(f"{name:<50} {summary['calls']:>6} {summary['wall_s']:>10.3f} "
+              f"{summary['wall_s'] / summary['calls']:>10.4f} {summary['max_wall_s']:>10.3f} "
+              f"{summary['max_peak_rss_mb']:>9.1f}")
@@ -0,0 +1,165 @@
+"""Fast NumPy/PIL previews of events for triage.
+
+PreviewRenderer draws an event the way StaticDetectorVisualization lays it
+out (modules relative to the hit centroid, the same camera rotation and frame
+to pixel mapping, time colours and charge radii) without building any
+mobjects: positions are rotated and projected orthographically with NumPy,
+and the hit strings and depth-sorted DOM discs are drawn into a PIL image.
+By default each event is zoomed to fill the image; the static view's
+perspective camera has no orthographic equivalent at a fixed scale.
+
+    renderer = PreviewRenderer(load_detector_geometry())
+    renderer.render_event(filename, run, event).save('preview.png')
+
+or for many events at once
+
+    python preview.py oscNext_genie_level7_v02.00_pass2.120000.000000.hdf5 --query "n_modules >= 25"
+"""
+import argparse
+import os
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from colormap import TimeColormap
+from geometry import load_detector_geometry, GEOMETRY_FILE
+from hits import aggregate_hits, time_window
+from pulses import read_event_pulses, iter_events
+
+# manim's default frame: 8 units high, 16:9 wide
+FRAME_HEIGHT = 8.
+FRAME_WIDTH = FRAME_HEIGHT * 16 / 9
+AXES_COLORS = ((252, 98, 85), (131, 193, 103), (88, 196, 221))  # manim RED, GREEN, BLUE
+
+
+def camera_rotation(phi, theta, gamma=0.):
+    """Rotation from world to camera coordinates, as in manim's ThreeDCamera."""
+    def about_z(angle):
+        c, s = np.cos(angle), np.sin(angle)
+        return np.array([[c, -s, 0.], [s, c, 0.], [0., 0., 1.]])
+    c, s = np.cos(-phi), np.sin(-phi)
+    about_x = np.array([[1., 0., 0.], [0., c, -s], [0., s, c]])
+    return about_z(gamma) @ about_x @ about_z(-theta - np.pi / 2)
+
+
+class PreviewRenderer:
+    def __init__(self, geometry, pixel_width=480, pixel_height=480, frame_width=FRAME_WIDTH,
+                 frame_height=FRAME_HEIGHT, phi=np.pi / 2, theta=0., zoom=None, radius_scale=3.,
+                 containment=0.9, colormap=None, background=(0, 0, 0)):
+        self.geometry = geometry
+        self.pixel_size = (pixel_width, pixel_height)
+        # Same frame -> pixel mapping as manim's camera (x and y scale independently).
+        # zoom scales scene units onto that frame; None fits each event into the image
+        self.frame_size = np.array([frame_width, frame_height])
+        self.scale = np.array([pixel_width / frame_width, -pixel_height / frame_height])
+        self.zoom = zoom
+        self.offset = np.array([pixel_width / 2, pixel_height / 2])
+        self.rotation = camera_rotation(phi, theta)
+        self.radius_scale = radius_scale
+        self.containment = containment
+        self.colormap = colormap or TimeColormap()
+        self.background = background
+        self.font = ImageFont.load_default()
+
+    def project(self, points, zoom=1.):
+        """Pixel coordinates (N, 2) and depths towards the camera (N,) of scene points."""
+        camera_points = np.asarray(points, dtype=np.float64).reshape(-1, 3) @ self.rotation.T
+        return camera_points[:, :2] * zoom * self.scale + self.offset, camera_points[:, 2]
+
+    def fit_zoom(self, points, radii=0., margin=0.9):
+        """Zoom at which points (discs of the given radii) around the origin fill margin of the frame."""
+        camera_points = np.asarray(points, dtype=np.float64).reshape(-1, 3) @ self.rotation.T
+        extent = np.abs(camera_points[:, :2]) + np.broadcast_to(radii, len(camera_points))[:, None]
+        half_extent = extent.max(axis=0) if len(extent) else np.zeros(2)
+        with np.errstate(divide='ignore'):
+            zoom = np.min(margin * self.frame_size / 2 / half_extent)
+        return float(zoom) if np.isfinite(zoom) else 1.
+
+    def draw(self, dom_positions, radii, rgbs, centroid, hit_strings=(), label=None):
+        """Image of DOM discs at world positions, viewed relative to centroid.
+
+        radii are in scene units and rgbs in [0, 1]; hit_strings get a line
+        spanning the z range of the DOMs, as in the static view.
+        """
+        image = Image.new('RGB', self.pixel_size, self.background)
+        draw = ImageDraw.Draw(image)
+        offsets = np.asarray(dom_positions, dtype=np.float64) - centroid
+        radii = np.asarray(radii, dtype=np.float64)
+
+        ends = np.zeros((0, 3))
+        if len(offsets) and len(hit_strings):
+            min_z, max_z = offsets[:, 2].min(), offsets[:, 2].max()
+            xy = self.geometry.string_xy(hit_strings) - centroid[:2]
+            ends = np.concatenate((np.column_stack((xy, np.full(len(xy), min_z))),
+                                   np.column_stack((xy, np.full(len(xy), max_z)))))
+        zoom = self.zoom or self.fit_zoom(np.vstack((offsets, ends)),
+                                          np.concatenate((radii, np.zeros(len(ends)))))
+
+        pixels, _ = self.project(ends, zoom)
+        n_strings = len(ends) // 2
+        for start, end in zip(pixels[:n_strings], pixels[n_strings:]):
+            draw.line((*start, *end), fill=(255, 255, 255), width=1)
+
+        # Farthest discs first, so nearer ones are drawn over them
+        pixels, depths = self.project(offsets, zoom)
+        pixel_radii = np.abs(radii[:, None] * zoom * self.scale)
+        colors = np.rint(np.asarray(rgbs) * 255).astype(int)
+        for i in np.argsort(depths, kind='stable'):
+            (x, y), (rx, ry) = pixels[i], pixel_radii[i]
+            draw.ellipse((x - rx, y - ry, x + rx, y + ry), fill=tuple(colors[i]))
+
+        # Axes indicator at the centroid, 5 units long
+        axes, _ = self.project(np.vstack((np.zeros(3), 5. * np.eye(3))), zoom)
+        for end, color in zip(axes[1:], AXES_COLORS):
+            draw.line((*axes[0], *end), fill=color, width=2)
+        if label:
+            width = draw.multiline_textbbox((0, 0), label, font=self.font)[2]
+            draw.multiline_text((self.pixel_size[0] - width - 10, 10), label, fill=(255, 255, 255),
+                                font=self.font)
+        return image
+
+    def render(self, hits, run=None, event=None):
+        """Preview of an event's DOMHits, with the static view's radii and colours."""
+        positions = self.geometry.positions_for(hits.strings, hits.oms)
+        known = ~np.isnan(positions[:, 0])
+        positions = positions[known]
+        centroid = positions.mean(axis=0) if len(positions) else np.zeros(3)
+        time_min, time_max = time_window(hits.times, self.containment)
+        charges = hits.total_charge[known]
+        radii = self.radius_scale * (0.5 + charges / charges.max() * 1.5) if len(charges) else charges
+        rgbs = self.colormap.rgb(hits.mean_time[known], time_min, time_max)
+        label = f"Run: {run}\nEvent: {event}" if run is not None else None
+        return self.draw(positions, radii, rgbs, centroid, np.unique(hits.strings[known]), label)
+
+    def render_event(self, filename, run, event):
+        return self.render(aggregate_hits(read_event_pulses(filename, run, event)), run, event)
+
+
+def render_previews(files, directory, selection=None, renderer=None):
+    """Write run<run>_event<event>.png previews of the selected events; returns the paths."""
+    renderer = renderer or PreviewRenderer(load_detector_geometry(GEOMETRY_FILE))
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for _, run, event, hits in iter_events(files, selection, aggregate=True):
+        path = os.path.join(directory, f"run{run}_event{event}.png")
+        renderer.render(hits, run, event).save(path)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    from catalog import EventCatalog
+
+    parser = argparse.ArgumentParser(description="Write quick preview images of events")
+    parser.add_argument('files', nargs='+', help="pulse HDF5 files")
+    parser.add_argument('--query', help='only events matching a catalog query, e.g. "n_modules >= 25"')
+    parser.add_argument('--directory', default=os.path.join('media', 'previews'))
+    parser.add_argument('--size', type=int, nargs=2, default=(480, 480), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--zoom', type=float,
+                        help="fixed scale of scene units on manim's frame (default: fit each event)")
+    args = parser.parse_args()
+
+    geometry = load_detector_geometry(GEOMETRY_FILE)
+    renderer = PreviewRenderer(geometry, *args.size, zoom=args.zoom)
+    for filename in args.files:
+        selection = EventCatalog.from_file(filename, geometry).query(args.query) if args.query else None
+        paths = render_previews(filename, args.directory, selection, renderer)
+        print(f"Wrote {len(paths)} previews of {filename} to {args.directory}")
@@ -0,0 +1,325 @@
+"""Fast access to the pulse series in the oscNext HDF5 files.
+
+The pulse tables are written one event after another, so every (Run, Event)
+occupies a contiguous block of rows.  An EventIndex records those blocks once
+per file (in a small .npz sidecar next to it) so that a single event can be
+read with one hyperslab instead of loading and masking the whole dataset.
+Files whose events are interleaved still work: their index records the row
+range spanning each event, and reads mask that range by (Run, Event).
+
+Whole-file scans go through iter_pulse_chunks(), which reads only the fields
+that are needed, in bounded row ranges, optionally down-cast to compact types,
+so peak memory does not grow with the size of the file.  iter_events() builds
+on both to stream selected events from one or many files in a single pass.
+publish_event_index()/attach_event_index() share an index with worker
+processes as memory-mapped arrays.
+"""
+import os
+import h5py
+import numpy as np
+from caching import file_fingerprint, atomic_savez, load_sidecar
+from hits import aggregate_hits
+from shared_arrays import publish_arrays, attach_arrays
+
+PULSE_DATASET = 'SRTTWOfflinePulsesDC'
+INDEX_SUFFIX = '.eventindex.npz'
+
+# The only pulse fields the viewers use
+PULSE_FIELDS = ('Run', 'Event', 'string', 'om', 'time', 'charge')
+# Smallest types that hold the IceCube values (86 strings, 64 OMs, ns times)
+COMPACT_DTYPES = {
+    'Run': np.uint32,
+    'Event': np.uint32,
+    'string': np.int16,
+    'om': np.int16,
+    'time': np.float32,
+    'charge': np.float32,
+}
+CHUNK_ROWS = 1 << 20
+
+# In-process cache of loaded indices: (abs path, dataset) -> EventIndex
+_index_cache = {}
+
+
+def event_keys(runs, events):
+    """Pack (Run, Event) pairs into sortable int64 keys."""
+    return (np.asarray(runs, dtype=np.int64) << 32) | np.asarray(events, dtype=np.int64)
+
+
+class EventIndex:
+    """Maps (Run, Event) -> [start, stop) row range in a pulse dataset.
+
+    If the file's events are not stored contiguously (contiguous=False) the
+    range is the smallest one holding all of an event's rows, and may also
+    hold rows of other events.
+    """
+
+    def __init__(self, runs, events, starts, stops, fingerprint=None, order=None, sorted_keys=None,
+                 contiguous=True):
+        # Keep the per-event arrays in file order, and a key-sorted view for lookups
+        self.runs = np.asarray(runs)
+        self.events = np.asarray(events)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        self.fingerprint = fingerprint
+        self.contiguous = bool(contiguous)
+        if order is None:
+            keys = event_keys(self.runs, self.events)
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+        self._order = order
+        self._sorted_keys = sorted_keys
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def build(cls, filename, dataset=PULSE_DATASET):
+        """Scan the Run/Event columns of a pulse file once and find the event blocks."""
+        print(f"Building event index for {filename}...")
+        runs, events, starts = [], [], []
+        n_rows = 0
+        last_key = None
+        for chunk in iter_pulse_chunks(filename, ('Run', 'Event'), dataset=dataset):
+            keys = event_keys(chunk['Run'], chunk['Event'])
+            new_event = np.ones(len(keys), dtype=bool)
+            new_event[1:] = keys[1:] != keys[:-1]
+            if last_key is not None and len(keys):
+                new_event[0] = keys[0] != last_key
+            first_rows = np.flatnonzero(new_event)
+            runs.append(chunk['Run'][first_rows])
+            events.append(chunk['Event'][first_rows])
+            starts.append(first_rows + n_rows)
+            n_rows += len(keys)
+            if len(keys):
+                last_key = keys[-1]
+
+        if n_rows == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(empty, empty, empty, empty, file_fingerprint(filename))
+        runs, events, starts = np.concatenate(runs), np.concatenate(events), np.concatenate(starts)
+        stops = np.append(starts[1:], n_rows)
+        index = cls(runs, events, starts, stops, file_fingerprint(filename))
+        if np.any(index._sorted_keys[1:] == index._sorted_keys[:-1]):
+            print(f"Warning: pulses of an event are not stored contiguously in {filename}, "
+                  f"events will be read by masking their row ranges")
+            # One entry per event in order of first appearance, spanning all of its blocks
+            keys = event_keys(runs, events)
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            event_stops = np.zeros(len(first), dtype=np.int64)
+            np.maximum.at(event_stops, inverse, stops)
+            order = np.sort(first)
+            event_stops = event_stops[inverse[order]]
+            index = cls(runs[order], events[order], starts[order], event_stops,
+                        file_fingerprint(filename), contiguous=False)
+        print(f"Indexed {len(index)} events in {n_rows} pulse rows")
+        return index
+
+    @classmethod
+    def load(cls, filename, dataset=PULSE_DATASET):
+        """Return the index for a file, building and saving the sidecar if needed."""
+        path = os.path.abspath(filename)
+        fingerprint = file_fingerprint(path)
+        cached = _index_cache.get((path, dataset))
+        if cached is not None and np.array_equal(cached.fingerprint, fingerprint):
+            return cached
+
+        sidecar = path + INDEX_SUFFIX
+        index = None
+        # A sidecar that cannot be read is stale, like one of another file version
+        data = load_sidecar(sidecar)
+        if (data is not None and str(data.get('dataset')) == dataset and 'contiguous' in data and
+                np.array_equal(data.get('fingerprint'), fingerprint)):
+            index = cls(data['runs'], data['events'], data['starts'],
+                        data['stops'], fingerprint, contiguous=data['contiguous'])
+        if index is None:
+            index = cls.build(path, dataset)
+            try:
+                index.save(sidecar, dataset)
+            except OSError as err:
+                print(f"Warning: could not write event index {sidecar}: {err}")
+        _index_cache[(path, dataset)] = index
+        return index
+
+    def save(self, sidecar, dataset=PULSE_DATASET):
+        atomic_savez(sidecar, runs=self.runs, events=self.events, starts=self.starts,
+                     stops=self.stops, fingerprint=self.fingerprint, dataset=dataset,
+                     contiguous=self.contiguous)
+
+    def lookup(self, run, event):
+        """Row range (start, stop) of an event, or None if it is not in the file.
+
+        For a non-contiguous index the range has to be masked with event_rows().
+        """
+        key = int(event_keys(run, event))
+        pos = np.searchsorted(self._sorted_keys, key)
+        if pos == len(self._sorted_keys) or self._sorted_keys[pos] != key:
+            return None
+        i = self._order[pos]
+        return int(self.starts[i]), int(self.stops[i])
+
+    def event_ranges(self, chunk_rows=CHUNK_ROWS):
+        """Row ranges of about chunk_rows rows that never split an event."""
+        if len(self) == 0:
+            return []
+        n_rows = int(self.stops.max())
+        if not self.contiguous:
+            # Any cut could split an interleaved event
+            return [(0, n_rows)]
+        targets = np.arange(chunk_rows, n_rows, chunk_rows)
+        # Move every cut back to the start of the event it falls in
+        cuts = np.unique(self.starts[np.searchsorted(self.starts, targets, side='right') - 1])
+        cuts = np.concatenate(([0], cuts[cuts > 0], [n_rows]))
+        return list(zip(cuts[:-1].tolist(), cuts[1:].tolist()))
+
+
+def event_rows(pulses, run, event):
+    """The rows of one event in a structured array also holding other events."""
+    return pulses[(pulses['Run'] == run) & (pulses['Event'] == event)]
+
+
+def _mask_fields(fields):
+    """fields plus the Run/Event columns needed to mask a non-contiguous event range."""
+    return tuple(fields) + tuple(name for name in ('Run', 'Event') if name not in fields)
+
+
+def _select_fields(pulses, fields):
+    """Copy of a structured array with only the given fields, in that order."""
+    if list(pulses.dtype.names) == list(fields):
+        return pulses
+    selected = np.empty(len(pulses), dtype=[(name, pulses.dtype.fields[name][0]) for name in fields])
+    for name in fields:
+        selected[name] = pulses[name]
+    return selected
+
+
+def compact_dtype(dtype):
+    """dtype with the fields listed in COMPACT_DTYPES down-cast."""
+    return np.dtype([(name, COMPACT_DTYPES.get(name, dtype.fields[name][0]))
+                     for name in dtype.names])
+
+
+def iter_pulse_chunks(filename, fields=PULSE_FIELDS, chunk_rows=CHUNK_ROWS, compact=False,
+                      row_ranges=None, dataset=PULSE_DATASET):
+    """Yield structured arrays holding only `fields`, chunk_rows rows at a time.
+
+    row_ranges, a sequence of (start, stop), overrides the fixed-size chunking,
+    e.g. EventIndex.event_ranges() to keep each event within one chunk.
+    """
+    with h5py.File(filename, 'r') as f:
+        dset = f[dataset]
+        view = dset.fields(list(fields))
+        if row_ranges is None:
+            n_rows = len(dset)
+            row_ranges = ((start, min(start + chunk_rows, n_rows))
+                          for start in range(0, n_rows, chunk_rows))
+        for start, stop in row_ranges:
+            chunk = view[start:stop]
+            if compact:
+                chunk = chunk.astype(compact_dtype(chunk.dtype))
+            yield chunk
+
+
+def read_event_pulses(filename, run, event, fields=PULSE_FIELDS, compact=False,
+                      dataset=PULSE_DATASET):
+    """Read only the pulse rows of one event (empty array if it is absent)."""
+    index = EventIndex.load(filename, dataset)
+    rows = index.lookup(run, event)
+    if rows is None:
+        rows = (0, 0)
+    if index.contiguous:
+        return next(iter_pulse_chunks(filename, fields, compact=compact, row_ranges=[rows],
+                                      dataset=dataset))
+    pulses = next(iter_pulse_chunks(filename, _mask_fields(fields), compact=compact,
+                                    row_ranges=[rows], dataset=dataset))
+    return _select_fields(event_rows(pulses, run, event), fields)
+
+
+def _selected_events(index, filename, selection):
+    """Indices (in file order) of the index's events picked by `selection`."""
+    if selection is None:
+        return np.arange(len(index))
+    keys = event_keys(index.runs, index.events)
+    if hasattr(selection, 'items'):
+        # An EventCatalog: only its rows belonging to this file
+        path = os.path.abspath(filename)
+        wanted = [(run, event) for f, run, event in selection.items() if f == path]
+    elif callable(selection):
+        return np.flatnonzero([selection(run, event) for run, event in
+                               zip(index.runs.tolist(), index.events.tolist())])
+    else:
+        wanted = list(selection)
+    wanted_keys = event_keys([run for run, _ in wanted], [event for _, event in wanted])
+    return np.flatnonzero(np.isin(keys, wanted_keys))
+
+
+def _group_reads(starts, stops, chunk_rows):
+    """Merge neighbouring event row ranges into reads spanning at most chunk_rows rows.
+
+    Returns a list of (read_start, read_stop, first, last) with events
+    first..last-1 (positions in starts/stops) inside each read.  starts must
+    be increasing; the ranges of a non-contiguous index may overlap.
+    """
+    reads = []
+    first = 0
+    read_stop = stops[0] if len(stops) else 0
+    for i in range(1, len(starts) + 1):
+        if i == len(starts) or max(read_stop, stops[i]) - starts[first] > chunk_rows:
+            reads.append((int(starts[first]), int(read_stop), first, i))
+            if i < len(starts):
+                first, read_stop = i, stops[i]
+        else:
+            read_stop = max(read_stop, stops[i])
+    return reads
+
+
+def iter_events(files, selection=None, aggregate=False, fields=PULSE_FIELDS, compact=False,
+                chunk_rows=CHUNK_ROWS, dataset=PULSE_DATASET):
+    """Stream events from one or many pulse files, opening each file once.
+
+    Events come out in file order, which is (Run, Event) order for the oscNext
+    files, as (filename, run, event, data) where data is the event's
+    structured pulse array, or its DOMHits if aggregate=True.
+
+    selection restricts the events: a collection of (run, event) pairs, a
+    callable(run, event) -> bool, or an EventCatalog (e.g. a query result).
+    Only the rows of selected events are read, in reads of <= chunk_rows rows
+    where events are close together.
+    """
+    if isinstance(files, (str, os.PathLike)):
+        files = [files]
+    for filename in files:
+        index = EventIndex.load(filename, dataset)
+        chosen = _selected_events(index, filename, selection)
+        starts, stops = index.starts[chosen], index.stops[chosen]
+        reads = _group_reads(starts, stops, chunk_rows)
+        read_fields = fields if index.contiguous else _mask_fields(fields)
+        chunks = iter_pulse_chunks(filename, read_fields, compact=compact, dataset=dataset,
+                                   row_ranges=[(start, stop) for start, stop, _, _ in reads])
+        for (read_start, _, first, last), chunk in zip(reads, chunks):
+            for i in range(first, last):
+                pulses = chunk[starts[i] - read_start:stops[i] - read_start]
+                run, event = int(index.runs[chosen[i]]), int(index.events[chosen[i]])
+                if not index.contiguous:
+                    pulses = _select_fields(event_rows(pulses, run, event), fields)
+                yield filename, run, event, aggregate_hits(pulses) if aggregate else pulses
+
+
+def publish_event_index(directory, filename, dataset=PULSE_DATASET):
+    """Publish a file's EventIndex for attach_event_index() in other processes."""
+    index = EventIndex.load(filename, dataset)
+    publish_arrays(directory, path=np.array([os.path.abspath(filename)]),
+                   dataset=np.array([dataset]), fingerprint=index.fingerprint,
+                   runs=index.runs, events=index.events, starts=index.starts,
+                   stops=index.stops, order=index._order, sorted_keys=index._sorted_keys,
+                   contiguous=np.array([index.contiguous]))
+
+
+def attach_event_index(directory):
+    """Map a published EventIndex and make EventIndex.load() return it."""
+    arrays = attach_arrays(directory)
+    index = EventIndex(arrays['runs'], arrays['events'], arrays['starts'], arrays['stops'],
+                       np.asarray(arrays['fingerprint']), arrays['order'], arrays['sorted_keys'],
+                       bool(arrays['contiguous'][0]))
+    _index_cache[(str(arrays['path'][0]), str(arrays['dataset'][0]))] = index
+    return index
@@ -0,0 +1,81 @@
+"""Content-addressed cache of rendered event images and movies.
+
+A render is keyed by a hash of everything that determines its pixels: the
+event's pulse rows, the geometry arrays and the scene and render parameters.
+RenderCache keeps one file per key and returns it instead of rendering again,
+so re-running a gallery only renders events (or settings) that changed:
+
+    cache = RenderCache('media/render_cache', max_bytes=2**30)
+    key = content_key(pulses, geometry.positions, settings.to_config())
+    path = cache.get(key, '.png') or cache.put(key, render())
+
+The cache is bounded by total size; the least recently used files (by mtime,
+which get() refreshes) are removed first.
+"""
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+
+def content_key(*parts):
+    """Hex digest of arrays (by dtype, shape and bytes) and JSON-serialisable values."""
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part)
+            digest.update(f"{part.dtype.str}{part.shape}".encode('utf-8'))
+            digest.update(part.tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True,
+                                     default=lambda value: np.asarray(value).tolist()).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class RenderCache:
+    def __init__(self, directory=os.path.join('media', 'render_cache'), max_bytes=2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key, suffix):
+        """Path of the cached file for key, or None."""
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, filename):
+        """Copy a rendered file into the cache and return its cached path."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key, os.path.splitext(filename)[1])
+        tmp = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(filename, tmp)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Remove least recently used files until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # removed by another process
+            total -= size
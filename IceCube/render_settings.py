@@ -0,0 +1,76 @@
+"""Per-scene render settings instead of edits to manim's global config.
+
+Scripts used to set config.pixel_width, config.output_file, ... globally before
+rendering, which leaks into every later scene in the same process.  A scene
+that mixes in RenderSettingsMixin gets a RenderSettings object and applies it
+(with tempconfig) only while that scene is constructed and rendered:
+
+    scene = MyScene(render_settings=RenderSettings(pixel_width=480, pixel_height=480,
+                                                   output_file="my_scene"))
+    scene.render()
+
+manim's config is a single process-wide object, so applying settings is
+serialised with a lock: scenes in different threads render one at a time, but
+none of them sees another's settings.
+"""
+import dataclasses
+import threading
+from contextlib import contextmanager
+from manim import config, tempconfig
+
+_config_lock = threading.RLock()
+
+
+@dataclasses.dataclass
+class RenderSettings:
+    # None leaves the corresponding config value (e.g. from the command line) alone
+    pixel_width: int = None
+    pixel_height: int = None
+    frame_rate: float = None
+    media_width: str = None
+    output_file: str = None
+    save_last_frame: bool = None
+    write_to_movie: bool = None
+    output_suffix: str = ''  # appended to output_file, e.g. to keep draft and final files apart
+    options: dict = dataclasses.field(default_factory=dict)  # any other config keys
+
+    def to_config(self):
+        values = {name: value for name, value in dataclasses.asdict(self).items()
+                  if name not in ('options', 'output_suffix') and value is not None}
+        if self.output_file is not None:
+            values['output_file'] = self.output_file + self.output_suffix
+        values.update(self.options)
+        return values
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+    def draft(self, scale=0.5, frame_rate=10):
+        """Quick-preview copy: scale times the pixel size (same framing) and at most frame_rate fps.
+
+        Its files get a _draft suffix, so they never overwrite full-quality renders.
+        """
+        pixel_width = self.pixel_width or config.pixel_width
+        pixel_height = self.pixel_height or config.pixel_height
+        return self.replace(pixel_width=max(int(pixel_width * scale), 1),
+                            pixel_height=max(int(pixel_height * scale), 1),
+                            frame_rate=min(self.frame_rate or config.frame_rate, frame_rate),
+                            output_suffix=self.output_suffix + '_draft')
+
+    @contextmanager
+    def applied(self):
+        with _config_lock, tempconfig(self.to_config()):
+            yield
+
+
+class RenderSettingsMixin:
+    """Scene mixin: apply self.render_settings while the scene is built and rendered."""
+
+    def __init__(self, *args, render_settings=None, **kwargs):
+        self.render_settings = render_settings or RenderSettings()
+        with self.render_settings.applied():
+            super().__init__(*args, **kwargs)
+
+    def render(self, *args, **kwargs):
+        with self.render_settings.applied():
+            return super().render(*args, **kwargs)
@@ -0,0 +1,29 @@
+"""Share read-only arrays between processes through memory-mapped .npy files.
+
+A parent process publishes arrays once into a directory; worker processes
+attach to them with np.load(mmap_mode='r'), so every worker reads the same
+pages of the OS page cache instead of holding its own copy, and attaching costs
+no more than opening a few files.
+"""
+import os
+import numpy as np
+
+
+def publish_arrays(directory, **arrays):
+    """Write each array to <directory>/<name>.npy."""
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        path = os.path.join(directory, name + '.npy')
+        tmp = path + '.tmp.npy'
+        np.save(tmp, np.asarray(array))
+        os.replace(tmp, path)
+    return directory
+
+
+def attach_arrays(directory):
+    """Dict of name -> read-only memory-mapped array for everything published in directory."""
+    arrays = {}
+    for entry in sorted(os.listdir(directory)):
+        if entry.endswith('.npy') and not entry.endswith('.tmp.npy'):
+            arrays[entry[:-len('.npy')]] = np.load(os.path.join(directory, entry), mmap_mode='r')
+    return arrays
@@ -0,0 +1,187 @@
+"""Synthetic IceCube-style geometry and pulse files for testing and benchmarks.
+
+The files use the same layout the viewers read, so they can stand in for the
+real geometry and oscNext files on machines without data access:
+
+    geometry  'geo' (N, 5) float64 with 'labels' string, om, pos_x, pos_y, pos_z
+    pulses    'SRTTWOfflinePulsesDC' with Run, Event, string, om, time, charge,
+              one contiguous block of rows per event, sorted by (string, om, time)
+
+The detector is 78 strings on a 125 m triangular grid plus 8 denser DeepCore
+strings, 60 in-ice modules each and 4 IceTop modules on the standard strings.
+Events are light clouds around a random vertex: pulses land on modules near
+it with times growing with distance, plus uniformly scattered noise hits.
+Pulses are generated and written in batches, so files up to 1e8 pulses need
+only a bounded amount of memory:
+
+    python synthetic.py --geometry synthetic_geometry.hdf5 --pulses synthetic_1e6.hdf5 --n-pulses 1e6
+"""
+import argparse
+import h5py
+import numpy as np
+from geometry import DetectorGeometry
+from pulses import PULSE_DATASET, CHUNK_ROWS
+
+PULSE_DTYPE = np.dtype([
+    ('Run', np.uint32),
+    ('Event', np.uint32),
+    ('string', np.uint32),
+    ('om', np.uint32),
+    ('time', np.float64),
+    ('charge', np.float64),
+])
+GEOMETRY_LABELS = ('string', 'om', 'pos_x', 'pos_y', 'pos_z')
+
+N_STANDARD_STRINGS = 78
+N_DEEPCORE_STRINGS = 8
+IN_ICE_OMS = 60
+ICETOP_OMS = 4
+STRING_SPACING = 125.  # m
+SPEED_IN_ICE = 0.22  # m/ns, group velocity of light in ice
+NOISE_FRACTION = 0.1
+NEIGHBOUR_STRINGS = 7  # strings an event's light reaches, including the vertex string
+
+
+def synthetic_geometry():
+    """(strings, oms, positions) arrays of an IceCube-like detector."""
+    # Triangular grid points nearest to the centre for the standard strings
+    i, j = np.meshgrid(np.arange(-6, 7), np.arange(-6, 7))
+    grid = np.column_stack((i.ravel() + 0.5 * j.ravel(), j.ravel() * np.sqrt(3) / 2)) * STRING_SPACING
+    grid = grid[np.argsort(np.hypot(grid[:, 0], grid[:, 1]), kind='stable')][:N_STANDARD_STRINGS]
+    # DeepCore: a ring of 72 m around the centre string
+    angles = np.arange(N_DEEPCORE_STRINGS) * 2 * np.pi / N_DEEPCORE_STRINGS
+    deepcore = np.column_stack((np.cos(angles), np.sin(angles))) * 72.
+    string_xy = np.vstack((grid, deepcore))
+
+    standard_z = np.linspace(500., -505., IN_ICE_OMS)
+    deepcore_z = np.concatenate((np.linspace(188., -155., 10), np.linspace(-157., -505., 50)))
+    icetop_z = np.full(ICETOP_OMS, 1950.)
+
+    strings, oms, positions = [], [], []
+    for string, (x, y) in enumerate(string_xy, 1):
+        z = standard_z if string <= N_STANDARD_STRINGS else deepcore_z
+        if string <= N_STANDARD_STRINGS:
+            z = np.concatenate((z, icetop_z))
+        strings.append(np.full(len(z), string))
+        oms.append(np.arange(1, len(z) + 1))
+        positions.append(np.column_stack((np.full(len(z), x), np.full(len(z), y), z)))
+    return np.concatenate(strings), np.concatenate(oms), np.vstack(positions)
+
+
+def write_geometry(filename):
+    """Write a synthetic geometry file and return it as a DetectorGeometry."""
+    strings, oms, positions = synthetic_geometry()
+    with h5py.File(filename, 'w') as f:
+        f['geo'] = np.column_stack((strings, oms, positions)).astype(np.float64)
+        f['labels'] = np.array([label.encode('utf-8') for label in GEOMETRY_LABELS])
+    return DetectorGeometry(strings, oms, positions)
+
+
+class PulseGenerator:
+    """Draws batches of synthetic events on a DetectorGeometry."""
+
+    def __init__(self, geometry, mean_pulses=100, seed=0):
+        self.geometry = geometry
+        self.mean_pulses = mean_pulses
+        self.rng = np.random.default_rng(seed)
+
+        self.in_ice = np.flatnonzero(geometry.oms <= IN_ICE_OMS)
+        strings = np.unique(geometry.strings)
+        xy = geometry.string_xy(strings)
+        distances = np.hypot(*(xy[:, None, :] - xy[None, :, :]).transpose(2, 0, 1))
+        self.neighbours = np.zeros((strings.max() + 1, NEIGHBOUR_STRINGS), dtype=np.int64)
+        self.neighbours[strings] = strings[np.argsort(distances, axis=1)[:, :NEIGHBOUR_STRINGS]]
+
+    def event_sizes(self, n_events):
+        # Heavy-tailed like real events: most are small, a few have thousands of pulses
+        sizes = self.rng.lognormal(np.log(self.mean_pulses) - 0.5, 1., n_events)
+        return np.maximum(sizes.astype(np.int64), 1)
+
+    def events(self, sizes, run, first_event):
+        """Structured PULSE_DTYPE rows for events of the given sizes, one block per event."""
+        rng = self.rng
+        n_events, n_rows = len(sizes), int(sizes.sum())
+        event_of_row = np.repeat(np.arange(n_events), sizes)
+
+        # Vertex module of each event, and the light's arrival at every pulse's module
+        vertex_rows = self.in_ice[rng.integers(0, len(self.in_ice), n_events)]
+        vertex_strings = self.geometry.strings[vertex_rows][event_of_row]
+        vertex_oms = self.geometry.oms[vertex_rows][event_of_row]
+        nearby = np.minimum(rng.geometric(0.45, n_rows) - 1, NEIGHBOUR_STRINGS - 1)
+        strings = self.neighbours[vertex_strings, nearby]
+        oms = np.clip(vertex_oms + np.rint(rng.normal(0., 4., n_rows)).astype(np.int64), 1, IN_ICE_OMS)
+
+        # Noise hits anywhere in the in-ice detector
+        noise = rng.random(n_rows) < NOISE_FRACTION
+        noise_rows = self.in_ice[rng.integers(0, len(self.in_ice), np.count_nonzero(noise))]
+        strings[noise] = self.geometry.strings[noise_rows]
+        oms[noise] = self.geometry.oms[noise_rows]
+        rows = self.geometry.rows_for(strings, oms)
+        missing = rows < 0
+        rows[missing] = vertex_rows[event_of_row[missing]]
+        strings, oms = self.geometry.strings[rows], self.geometry.oms[rows]
+
+        distance = np.linalg.norm(self.geometry.positions[rows] -
+                                  self.geometry.positions[vertex_rows][event_of_row], axis=1)
+        times = 10000. + distance / SPEED_IN_ICE + rng.exponential(100., n_rows)
+        times[noise] = rng.uniform(9000., 20000., np.count_nonzero(noise))
+        charges = np.round(rng.exponential(1., n_rows) + 0.25, 3)
+
+        pulses = np.zeros(n_rows, dtype=PULSE_DTYPE)
+        pulses['Run'] = run
+        pulses['Event'] = first_event + event_of_row
+        pulses['string'] = strings
+        pulses['om'] = oms
+        pulses['time'] = times
+        pulses['charge'] = charges
+        order = np.lexsort((times, oms, strings, event_of_row))
+        return pulses[order]
+
+
+def write_pulses(filename, geometry, n_pulses, mean_pulses=100, events_per_run=100000, seed=0,
+                 batch_rows=CHUNK_ROWS, dataset=PULSE_DATASET):
+    """Write exactly n_pulses synthetic pulse rows; returns the number of events."""
+    n_pulses = int(n_pulses)
+    generator = PulseGenerator(geometry, mean_pulses, seed)
+    n_events = 0
+    with h5py.File(filename, 'w') as f:
+        pulses = f.create_dataset(dataset, shape=(n_pulses,), dtype=PULSE_DTYPE,
+                                  chunks=(min(max(n_pulses, 1), 65536),))
+        n_written = 0
+        while n_written < n_pulses:
+            sizes = generator.event_sizes(max(batch_rows // mean_pulses, 1))
+            # Keep the batch within batch_rows and the file size, truncating the last event
+            ends = np.cumsum(sizes)
+            limit = min(batch_rows, n_pulses - n_written)
+            keep = np.searchsorted(ends, limit, side='left') + 1
+            sizes = sizes[:keep]
+            sizes[-1] -= max(int(sizes.sum()) - limit, 0)
+
+            event_numbers = n_events + np.arange(len(sizes))
+            runs = 120000 + event_numbers // events_per_run
+            batch = []
+            for run in np.unique(runs):
+                in_run = runs == run
+                first = int(event_numbers[in_run][0] % events_per_run) + 1
+                batch.append(generator.events(sizes[in_run], int(run), first))
+            batch = np.concatenate(batch)
+            pulses[n_written:n_written + len(batch)] = batch
+            n_written += len(batch)
+            n_events += len(sizes)
+    print(f"Wrote {n_pulses} pulses in {n_events} events to {filename}")
+    return n_events
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic IceCube geometry and pulse files")
+    parser.add_argument('--geometry', default='synthetic_geometry.hdf5', help="geometry file to write")
+    parser.add_argument('--pulses', help="pulse file to write")
+    parser.add_argument('--n-pulses', type=float, default=1e6, help="number of pulse rows, e.g. 1e8")
+    parser.add_argument('--mean-pulses', type=int, default=100, help="typical pulses per event")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    geometry = write_geometry(args.geometry)
+    print(f"Wrote {len(geometry)} modules to {args.geometry}")
+    if args.pulses:
+        write_pulses(args.pulses, geometry, args.n_pulses, args.mean_pulses, seed=args.seed)
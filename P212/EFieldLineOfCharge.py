@@ -141,4 +141,4 @@ class ElectricFieldLineCharge(Scene):
 if __name__ == "__main__":
    with tempconfig({"output_file": "ElectricField"}):
        scene = ElectricFieldLineCharge()
-       scene.render()
\ No newline at end of file
+       scene.render()
@@ -125,4 +125,4 @@ if __name__ == "__main__":
             q3=1.0,
             # Add any other parameter overrides here
         )
-        scene.render()
\ No newline at end of file
+        scene.render()